@@ -0,0 +1,141 @@
+import os
+import sys
+import json
+import time
+import argparse
+import multiprocessing
+from core.processing import ProcessOptions, process_file
+from core.disk_cache import disk_cache, file_key
+
+
+MANIFEST_NAME = ".batch_manifest.jsonl"
+
+
+def find_tifs(folder, recursive=False):
+    found = []
+    for dirpath, dirnames, filenames in os.walk(folder):
+        if not recursive:
+            dirnames.clear()
+        dirnames.sort()
+        for filename in sorted(filenames):
+            if filename.lower().endswith(('.tif', '.tiff')):
+                found.append(os.path.join(dirpath, filename))
+    return found
+
+
+def load_manifest(pth):
+    done = {}
+    try:
+        with open(pth, "r") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # An interrupted run can leave the last line half written.
+                    break
+                done[record['input']] = record
+    except OSError:
+        pass
+    return done
+
+
+def is_done(record, src, dst, options):
+    return (record is not None and record.get('status') == "done"
+            and record.get('key') == file_key(src) and record.get('options') == options.key
+            and os.path.exists(dst))
+
+
+def run_job(job):
+    src, dst, options, use_cache = job
+    disk_cache.enabled = use_cache
+    start = time.perf_counter()
+    try:
+        process_file(src, dst, options)
+        error = None
+    except Exception as e:
+        error = str(e)
+    return src, dst, error, time.perf_counter() - start
+
+
+def format_eta(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours:d}:{minutes:02d}:{seconds:02d}"
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Apply log transfer, normalization and adjustments to folders of TIFs.")
+    parser.add_argument("input", help="folder with TIF files")
+    parser.add_argument("output", help="folder for the processed 8-bit TIFs")
+    parser.add_argument("-r", "--recursive", action="store_true", help="include subfolders")
+    parser.add_argument("--log", action="store_true", help="apply the log transfer")
+    parser.add_argument("--brightness", type=int, default=0, help="-100 to 100")
+    parser.add_argument("--contrast", type=float, default=1.0, help="0.0 to 2.0")
+    parser.add_argument("--min", dest="min_val", type=float, default=0.0, help="lower clip, 0.0 to 1.0")
+    parser.add_argument("--max", dest="max_val", type=float, default=1.0, help="upper clip, 0.0 to 1.0")
+    parser.add_argument("--bands", help="bands to write, e.g. 4,3,2")
+    parser.add_argument("--expression", help="band math, e.g. \"(b4 - b3) / (b4 + b3)\"")
+    parser.add_argument("--compress", default="deflate", help="GTiff compression, or 'none'")
+    parser.add_argument("--chunk-mb", type=int, default=16, help="approximate size in MB of each streamed read, across all bands")
+    parser.add_argument("-j", "--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--force", action="store_true", help="reprocess files already recorded in the manifest")
+    parser.add_argument("--no-cache", action="store_true", help="do not read or write the statistics disk cache")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    bands = [int(b) for b in args.bands.split(",")] if args.bands else None
+    options = ProcessOptions(log=args.log, brightness=args.brightness, contrast=args.contrast,
+                             min_val=args.min_val, max_val=args.max_val, bands=bands,
+                             expression=args.expression,
+                             compress=None if args.compress.lower() == "none" else args.compress,
+                             chunk_bytes=args.chunk_mb * 1024 * 1024)
+
+    sources = find_tifs(args.input, args.recursive)
+    if not sources:
+        print(f"No TIF files found in {args.input}")
+        return 1
+    os.makedirs(args.output, exist_ok=True)
+    manifest_pth = os.path.join(args.output, MANIFEST_NAME)
+    if args.force and os.path.exists(manifest_pth):
+        os.remove(manifest_pth)
+    manifest = load_manifest(manifest_pth)
+
+    jobs = []
+    for src in sources:
+        rel = os.path.relpath(src, args.input)
+        dst = os.path.join(args.output, rel)
+        if not is_done(manifest.get(rel), src, dst, options):
+            jobs.append((src, dst, options, not args.no_cache))
+    skipped = len(sources) - len(jobs)
+    if skipped:
+        print(f"Resuming: {skipped} of {len(sources)} files already done")
+
+    failed = 0
+    start = time.perf_counter()
+    workers = max(1, min(args.workers, len(jobs)))
+    with open(manifest_pth, "a") as manifest_file, multiprocessing.Pool(workers, maxtasksperchild=64) as pool:
+        for done, (src, dst, error, seconds) in enumerate(pool.imap_unordered(run_job, jobs), 1):
+            rel = os.path.relpath(src, args.input)
+            record = {'input': rel, 'key': file_key(src), 'options': options.key,
+                      'status': "failed" if error else "done", 'seconds': round(seconds, 3)}
+            if error:
+                record['error'] = error
+                failed += 1
+            manifest_file.write(json.dumps(record) + "\n")
+            manifest_file.flush()
+            os.fsync(manifest_file.fileno())
+
+            elapsed = time.perf_counter() - start
+            eta = elapsed / done * (len(jobs) - done)
+            status = f"FAILED: {error}" if error else f"{seconds:.1f}s"
+            print(f"[{done}/{len(jobs)}] {rel} {status} (ETA {format_eta(eta)})", flush=True)
+
+    print(f"Processed {len(jobs) - failed} files, {failed} failed, {skipped} skipped "
+          f"in {format_eta(time.perf_counter() - start)}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,261 @@
+# Run from the repository root:
+#   python -m benchmarks.run --save-baseline benchmarks/baselines/main.json
+#   python -m benchmarks.run --baseline benchmarks/baselines/main.json
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import tempfile
+import tracemalloc
+import statistics
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+import numpy as np
+from rasterio.windows import Window
+from PyQt6.QtWidgets import QApplication
+from PyQt6.QtCore import PYQT_VERSION_STR, QT_VERSION_STR
+from benchmarks.synthetic import SIZES, ensure_tif, synthetic_tags, tif_name
+from core.disk_cache import disk_cache
+from core.raster_source import RasterSource, to_uint8
+from core.raster_stats import stats_cache
+from core.tag_store import TagStore
+from core.tag_io import save_json, save_npz, load_json, load_npz
+from utils.image_buffer import numpy_to_qimage, qimage_to_numpy
+
+
+def measure(fn, repeat, setup=None):
+    times = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    # Peak memory comes from a separate run; tracing slows allocations down.
+    if setup is not None:
+        setup()
+    tracemalloc.start()
+    try:
+        fn()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {'seconds': min(times), 'median': statistics.median(times), 'peak_mb': peak / 1024 / 1024}
+
+
+class ImageBench:
+    def __init__(self, app, viewer, max_array_pixels, timeout=600):
+        self.app = app
+        self.viewer = viewer
+        self.max_array_pixels = max_array_pixels
+        self.timeout = timeout
+
+    def reset_caches(self):
+        viewer = self.viewer
+        stats_cache.clear()
+        viewer.tile_cache.clear()
+        viewer.display_tile_cache.clear()
+        viewer.prefetcher.cache.clear()
+        viewer.log_transfer.log_layer.clear()
+
+    def wait(self, done):
+        deadline = time.perf_counter() + self.timeout
+        while not done():
+            if time.perf_counter() > deadline:
+                raise TimeoutError("benchmark stage timed out")
+            self.app.processEvents()
+            time.sleep(0.001)
+
+    def load(self, pth):
+        viewer = self.viewer
+        viewer.load_tif_file(pth)
+        self.wait(lambda: viewer.image_item is not None or viewer.loader.task is None)
+        if viewer.image_item is None:
+            raise RuntimeError(viewer.info_label.text())
+
+    def render(self):
+        # Full resolution around the image centre, until every visible tile is drawn.
+        viewer = self.viewer
+        viewer.tile_cache.clear()
+        viewer.display_tile_cache.clear()
+        view = viewer.graphics_view
+        view.resetTransform()
+        view.centerOn(viewer.image_item.boundingRect().center())
+        viewer.image_item.drawn.clear()
+        view.viewport().grab()
+        self.wait(lambda: not viewer.image_item.pending)
+        view.viewport().grab()
+
+    def sample(self, pth):
+        # Whole image when it fits the budget, otherwise a centred crop of that size.
+        source = RasterSource(pth)
+        try:
+            pixels = source.width * source.height
+            if pixels <= self.max_array_pixels:
+                window = None
+            else:
+                side = int(self.max_array_pixels ** 0.5)
+                window = Window((source.width - side) // 2, (source.height - side) // 2, side, side)
+            return source.read(window), source.get_display_range()
+        finally:
+            source.close()
+
+    def run(self, pth, repeat):
+        results = {}
+        results['load'] = measure(lambda: self.load(pth), repeat, setup=self.reset_caches)
+        results['render'] = measure(self.render, repeat)
+
+        arr, (lo, hi) = self.sample(pth)
+        adjustment = self.viewer.adjustment
+        log_transfer = self.viewer.log_transfer
+        img_max = float(np.nanmax(arr)) if arr.dtype.kind == 'f' else float(arr.max())
+        results['log_transfer'] = measure(lambda: log_transfer.apply_log_transfer(arr, img_max=img_max), repeat)
+        results['adjust'] = measure(lambda: adjustment.apply_adjustments(arr, 20, 1.2, 0.1, 0.9, (lo, hi)), repeat)
+        display = to_uint8(arr, lo, hi)
+        if display.ndim == 2 or display.shape[2] in (3, 4):
+            results['numpy_to_qimage'] = measure(lambda: numpy_to_qimage(display), repeat)
+            qimage = numpy_to_qimage(display)
+            results['qimage_to_numpy'] = measure(lambda: qimage_to_numpy(qimage).sum(dtype=np.uint64), repeat)
+        for entry in results.values():
+            entry['pixels'] = int(arr.shape[0] * arr.shape[1])
+        return results
+
+
+def bench_tags(count, work_dir, repeat):
+    coords, labels, class_ids = synthetic_tags(count)
+    json_pth = os.path.join(work_dir, f"tags_{count}.json")
+    npz_pth = os.path.join(work_dir, f"tags_{count}.npz")
+    store = TagStore()
+
+    def fill():
+        store.clear()
+        store.add_many(coords, labels, class_ids)
+
+    rng = np.random.default_rng(1)
+    corners = rng.uniform(0, 9000, (200, 2))
+
+    def queries():
+        for x, y in corners:
+            store.hit_test(x, y)
+            store.query_rows(x, y, x + 1000, y + 1000)
+
+    results = {
+        'tags_save_json': measure(lambda: save_json(json_pth, coords, labels, class_ids), repeat),
+        'tags_save_npz': measure(lambda: save_npz(npz_pth, coords, labels, class_ids), repeat),
+        'tags_load_json': measure(lambda: load_json(json_pth), repeat),
+        'tags_load_npz': measure(lambda: load_npz(npz_pth), repeat),
+        'tags_index': measure(fill, repeat),
+    }
+    fill()
+    results['tags_query'] = measure(queries, repeat)
+    return results
+
+
+def compare(results, baseline, tolerance, min_seconds=0.005, min_mb=1.0):
+    regressions = 0
+    print(f"\n{'case':58} {'base s':>9} {'now s':>9} {'ratio':>6} {'base MB':>8} {'now MB':>8}")
+    for case, now in sorted(results.items()):
+        base = baseline.get(case)
+        if base is None:
+            print(f"{case:58} {'-':>9} {now['seconds']:9.4f}     new")
+            continue
+        ratio = now['seconds'] / max(base['seconds'], 1e-9)
+        slower = ratio > 1 + tolerance and now['seconds'] - base['seconds'] > min_seconds
+        faster = ratio < 1 - tolerance and base['seconds'] - now['seconds'] > min_seconds
+        bigger = (now['peak_mb'] > base['peak_mb'] * (1 + tolerance)
+                  and now['peak_mb'] - base['peak_mb'] > min_mb)
+        status = "REGRESSION" if slower or bigger else "improved" if faster else ""
+        regressions += bool(slower or bigger)
+        print(f"{case:58} {base['seconds']:9.4f} {now['seconds']:9.4f} {ratio:6.2f} "
+              f"{base['peak_mb']:8.1f} {now['peak_mb']:8.1f}  {status}")
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the viewer's load, render, adjust, log and tag paths.")
+    parser.add_argument("--sizes", default="1mp,16mp", help=f"comma separated, from {', '.join(SIZES)}")
+    parser.add_argument("--dtypes", default="uint8,uint16,float32")
+    parser.add_argument("--bands", default="1,3,8")
+    parser.add_argument("--layouts", default="tiled,striped")
+    parser.add_argument("--tags", default="1000,10000,100000", help="tag counts, or '' to skip")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--max-array-mp", type=float, default=64,
+                        help="largest array (megapixels) for the in-memory stages; bigger images use a crop")
+    parser.add_argument("--data-dir", default=os.path.join(tempfile.gettempdir(), "tif_viewer_bench"),
+                        help="where synthetic TIFs are generated and kept between runs")
+    parser.add_argument("--output", help="write results JSON here")
+    parser.add_argument("--save-baseline", help="write results as a baseline JSON")
+    parser.add_argument("--baseline", help="compare against this baseline JSON")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative slowdown")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    app = QApplication.instance() or QApplication(sys.argv[:1])
+    # Every load should be cold; the persistent cache would turn the suite into a cache benchmark.
+    disk_cache.enabled = False
+
+    import main as viewer_main
+    viewer = viewer_main.TifViewer()
+    viewer.resize(1280, 800)
+    viewer.show()
+    app.processEvents()
+    bench = ImageBench(app, viewer, int(args.max_array_mp * 1024 * 1024))
+
+    results = {}
+    for size in filter(None, args.sizes.split(",")):
+        for dtype in filter(None, args.dtypes.split(",")):
+            for bands in (int(b) for b in filter(None, args.bands.split(","))):
+                for layout in filter(None, args.layouts.split(",")):
+                    name = tif_name(size, dtype, bands, layout)[:-4]
+                    start = time.perf_counter()
+                    pth = ensure_tif(args.data_dir, size, np.dtype(dtype), bands, layout)
+                    generated = time.perf_counter() - start
+                    if generated > 1:
+                        print(f"generated {name} in {generated:.1f}s")
+                    for stage, entry in bench.run(pth, args.repeat).items():
+                        results[f"{stage}/{name}"] = entry
+                        print(f"{stage:16} {name:28} {entry['seconds'] * 1000:10.2f} ms "
+                              f"{entry['peak_mb']:9.1f} MB", flush=True)
+    viewer.clear_image_layers()
+
+    for count in (int(c) for c in filter(None, args.tags.split(","))):
+        for stage, entry in bench_tags(count, args.data_dir, args.repeat).items():
+            results[f"{stage}/{count}"] = entry
+            print(f"{stage:16} {count:<28} {entry['seconds'] * 1000:10.2f} ms {entry['peak_mb']:9.1f} MB", flush=True)
+
+    report = {
+        'meta': {
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'qt': QT_VERSION_STR,
+            'pyqt': PYQT_VERSION_STR,
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'repeat': args.repeat,
+        },
+        'results': results,
+    }
+    for pth in filter(None, (args.output, args.save_baseline)):
+        os.makedirs(os.path.dirname(os.path.abspath(pth)), exist_ok=True)
+        with open(pth, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"wrote {pth}")
+
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+        if baseline['meta'].get('platform') != report['meta']['platform']:
+            print(f"warning: baseline was recorded on {baseline['meta'].get('platform')}")
+        regressions = compare(results, baseline['results'], args.tolerance)
+        print(f"\n{regressions} regression(s)")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,83 @@
+import os
+import warnings
+import numpy as np
+import rasterio
+from rasterio.errors import NotGeoreferencedWarning
+from rasterio.windows import Window
+
+
+SIZES = {
+    "1mp": (1000, 1000),
+    "16mp": (4000, 4000),
+    "100mp": (10000, 10000),
+    "1gp": (32768, 32768),
+}
+
+
+def synthetic_rows(row0, rows, width, dtype, bands, seed=0):
+    # Gradients plus noise: compresses and histograms like real imagery, unlike pure noise.
+    rng = np.random.default_rng(seed + row0)
+    y = np.arange(row0, row0 + rows, dtype=np.float32)[:, None]
+    x = np.arange(width, dtype=np.float32)[None, :]
+    out = np.empty((bands, rows, width), dtype=dtype)
+    for band in range(bands):
+        values = (x * (0.37 + 0.05 * band) + y * 0.61) % 1024 / 1024
+        values = values + rng.normal(0, 0.05, size=(rows, width)).astype(np.float32)
+        np.clip(values, 0, 1, out=values)
+        if dtype == np.uint8:
+            out[band] = values * 255
+        elif dtype == np.uint16:
+            out[band] = values * 4095  # 12-bit sensor range, as most uint16 imagery uses
+        else:
+            values *= 1000
+            values[::97, ::89] = np.nan
+            out[band] = values
+    return out
+
+
+def tif_name(size, dtype, bands, layout):
+    return f"{size}_{np.dtype(dtype).name}_{bands}b_{layout}.tif"
+
+
+def make_tif(pth, width, height, dtype, bands, layout, block=256, seed=0, chunk_pixels=16 * 1024 * 1024):
+    profile = {
+        "driver": "GTiff",
+        "width": width,
+        "height": height,
+        "count": bands,
+        "dtype": np.dtype(dtype).name,
+        "interleave": "pixel",
+    }
+    if layout == "tiled":
+        profile.update(tiled=True, blockxsize=block, blockysize=block)
+    rows = max(block, chunk_pixels // max(1, width * bands) // block * block)
+    tmp = pth + ".tmp"
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", NotGeoreferencedWarning)
+        dst = rasterio.open(tmp, "w", **profile)
+    with dst:
+        for row in range(0, height, rows):
+            count = min(rows, height - row)
+            dst.write(synthetic_rows(row, count, width, np.dtype(dtype), bands, seed),
+                      window=Window(0, row, width, count))
+    os.replace(tmp, pth)
+
+
+def ensure_tif(data_dir, size, dtype, bands, layout):
+    pth = os.path.join(data_dir, tif_name(size, dtype, bands, layout))
+    if not os.path.exists(pth):
+        os.makedirs(data_dir, exist_ok=True)
+        width, height = SIZES[size]
+        make_tif(pth, width, height, dtype, bands, layout)
+    return pth
+
+
+def synthetic_tags(count, width=10000, height=10000, seed=0):
+    rng = np.random.default_rng(seed)
+    coords = np.empty((count, 4), dtype=np.float64)
+    coords[:, 0] = rng.uniform(0, width, count)
+    coords[:, 1] = rng.uniform(0, height, count)
+    coords[:, 2:] = rng.uniform(5, 80, (count, 2))
+    labels = [f"Tag-{i + 1}" for i in range(count)]
+    class_ids = rng.integers(0, 5, count).astype(np.int32)
+    return coords, labels, class_ids
@@ -0,0 +1,143 @@
+import ast
+import re
+import hashlib
+import numpy as np
+
+
+BAND_NAME = re.compile(r"^b(\d+)$")
+
+FUNCTIONS = {
+    "sqrt": np.sqrt,
+    "log": np.log,
+    "log1p": np.log1p,
+    "exp": np.exp,
+    "abs": np.abs,
+    "minimum": np.minimum,
+    "maximum": np.maximum,
+}
+
+OPERATORS = {
+    ast.Add: np.add,
+    ast.Sub: np.subtract,
+    ast.Mult: np.multiply,
+    ast.Div: np.divide,
+    ast.Pow: np.power,
+}
+
+PRESETS = {
+    "NDVI": "(b4 - b3) / (b4 + b3)",
+    "NDWI": "(b2 - b4) / (b2 + b4)",
+}
+
+
+class BandExpression:
+    def __init__(self, text):
+        self.text = text.strip()
+        try:
+            self.tree = ast.parse(self.text, mode="eval")
+        except SyntaxError as e:
+            raise ValueError(f"Invalid expression: {e.msg}")
+        self.bands = sorted(self.collect_bands(self.tree.body))
+        if not self.bands:
+            raise ValueError("Expression does not reference any band (use b1, b2, ...)")
+
+    def collect_bands(self, node):
+        if isinstance(node, ast.Name):
+            match = BAND_NAME.match(node.id)
+            if match is None or int(match.group(1)) < 1:
+                raise ValueError(f"Unknown name in expression: {node.id}")
+            return {int(match.group(1))}
+        if isinstance(node, ast.Constant):
+            if not isinstance(node.value, (int, float)):
+                raise ValueError(f"Unsupported constant: {node.value!r}")
+            return set()
+        if isinstance(node, ast.BinOp):
+            if type(node.op) not in OPERATORS:
+                raise ValueError(f"Unsupported operator: {type(node.op).__name__}")
+            return self.collect_bands(node.left) | self.collect_bands(node.right)
+        if isinstance(node, ast.UnaryOp):
+            if not isinstance(node.op, (ast.USub, ast.UAdd)):
+                raise ValueError(f"Unsupported operator: {type(node.op).__name__}")
+            return self.collect_bands(node.operand)
+        if isinstance(node, ast.Call):
+            if not isinstance(node.func, ast.Name) or node.func.id not in FUNCTIONS or node.keywords:
+                raise ValueError("Unsupported function call in expression")
+            bands = set()
+            for arg in node.args:
+                bands |= self.collect_bands(arg)
+            return bands
+        raise ValueError(f"Unsupported syntax in expression: {type(node).__name__}")
+
+    def evaluate(self, arrays):
+        with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+            result = self.eval_node(self.tree.body, arrays)
+        return np.asarray(result, dtype=np.float32)
+
+    def eval_node(self, node, arrays):
+        if isinstance(node, ast.Name):
+            return arrays[int(node.id[1:])]
+        if isinstance(node, ast.Constant):
+            return np.float32(node.value)
+        if isinstance(node, ast.BinOp):
+            return OPERATORS[type(node.op)](self.eval_node(node.left, arrays), self.eval_node(node.right, arrays))
+        if isinstance(node, ast.UnaryOp):
+            value = self.eval_node(node.operand, arrays)
+            return -value if isinstance(node.op, ast.USub) else value
+        return FUNCTIONS[node.func.id](*(self.eval_node(arg, arrays) for arg in node.args))
+
+
+class BandSelection:
+    def __init__(self, bands=None, expression=None):
+        self.expression = BandExpression(expression) if expression else None
+        self.bands = list(bands) if bands else []
+        if self.expression is None and len(self.bands) not in (1, 3):
+            raise ValueError("Select either one band or three bands for an RGB composite")
+
+    @property
+    def read_bands(self):
+        if self.expression is not None:
+            return self.expression.bands
+        return self.bands
+
+    @property
+    def key(self):
+        if self.expression is not None:
+            return "e" + hashlib.sha1(self.expression.text.encode("utf-8")).hexdigest()[:12]
+        return "b" + "-".join(str(b) for b in self.bands)
+
+    @property
+    def label(self):
+        if self.expression is not None:
+            return self.expression.text
+        return ", ".join(f"Band {b}" for b in self.bands)
+
+    def validate(self, count):
+        missing = [b for b in self.read_bands if b > count]
+        if missing:
+            raise ValueError(f"Band {missing[0]} does not exist (image has {count} bands)")
+
+    def output_dtype(self, dtype):
+        return np.dtype(np.float32) if self.expression is not None else dtype
+
+    def apply(self, arr, nodata=None):
+        # arr holds read_bands in order, as HxW for one band or HxWxC otherwise.
+        if self.expression is None:
+            return arr
+        layers = arr[..., None] if arr.ndim == 2 else arr
+        arrays = {}
+        for i, band in enumerate(self.read_bands):
+            layer = layers[..., i].astype(np.float32)
+            if nodata is not None and not np.isnan(nodata):
+                layer[layer == nodata] = np.nan
+            arrays[band] = layer
+        return self.expression.evaluate(arrays)
+
+    def __eq__(self, other):
+        return isinstance(other, BandSelection) and self.key == other.key
+
+    def __hash__(self):
+        return hash(self.key)
+
+
+def default_selection(count):
+    return BandSelection([1, 2, 3] if count >= 3 else [1])
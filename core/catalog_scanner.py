@@ -0,0 +1,70 @@
+from PyQt6.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+
+
+class ScanSignals(QObject):
+    listed = pyqtSignal(object, object, object)
+    progress = pyqtSignal(object, int, int)
+    finished = pyqtSignal(object, object)
+    failed = pyqtSignal(object, str)
+
+
+class ScanTask(QRunnable):
+    def __init__(self, catalog, signals, watch=False):
+        super().__init__()
+        self.setAutoDelete(False)
+        self.catalog = catalog
+        self.signals = signals
+        self.cancelled = False
+        self.done = False
+        # The folder watcher's snapshot comes from the same walk, so it never lists the tree itself.
+        self.folders = {} if watch else None
+
+    def run(self):
+        try:
+            self.scan()
+        finally:
+            self.done = True
+
+    def scan(self):
+        if self.cancelled:
+            return
+        try:
+            stats = self.catalog.scan(is_cancelled=lambda: self.cancelled,
+                                      listed=lambda stats: self.emit(self.signals.listed, stats, self.folders),
+                                      progress=lambda done, total: self.emit(self.signals.progress, done, total),
+                                      folders=self.folders)
+        except Exception as e:
+            self.emit(self.signals.failed, str(e))
+            return
+        if stats is not None:
+            self.emit(self.signals.finished, stats)
+
+    def emit(self, signal, *args):
+        if not self.cancelled:
+            signal.emit(self, *args)
+
+
+class CatalogScanner(QObject):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(1)
+        self.signals = ScanSignals()
+        self.task = None
+
+    def scan(self, catalog, watch=False):
+        self.cancel()
+        self.task = ScanTask(catalog, self.signals, watch)
+        self.pool.start(self.task)
+
+    def is_current(self, task):
+        return task is self.task and not task.cancelled
+
+    def is_busy(self):
+        return self.task is not None and not self.task.done
+
+    def cancel(self):
+        if self.task is not None:
+            self.task.cancelled = True
+            self.pool.tryTake(self.task)
+            self.task = None
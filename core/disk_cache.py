@@ -0,0 +1,116 @@
+import os
+import hashlib
+import threading
+import numpy as np
+
+
+def default_cache_dir():
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "tif_viewer")
+
+
+def file_key(pth):
+    st = os.stat(pth)
+    ident = f"{os.path.abspath(pth)}|{st.st_mtime_ns}|{st.st_size}"
+    return hashlib.sha1(ident.encode("utf-8")).hexdigest()
+
+
+def entry_name(kind, selection_key, *parts):
+    return "_".join([kind, selection_key] + [str(p) for p in parts])
+
+
+class DiskCache:
+    def __init__(self, root=None, max_bytes=2 * 1024 * 1024 * 1024):
+        self.root = root if root is not None else default_cache_dir()
+        self.max_bytes = max_bytes
+        self.total_bytes = None
+        self.lock = threading.Lock()
+        self.enabled = True
+        self.hits = 0
+        self.misses = 0
+
+    def entry_path(self, key, name):
+        return os.path.join(self.root, key[:2], key, name + ".npy")
+
+    def get(self, key, name):
+        if not self.enabled or key is None:
+            return None
+        pth = self.entry_path(key, name)
+        try:
+            arr = np.load(pth, mmap_mode="r")
+            # Touch the entry so eviction sees it as recently used.
+            os.utime(pth)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return arr
+
+    def put(self, key, name, arr):
+        if not self.enabled or key is None:
+            return
+        pth = self.entry_path(key, name)
+        tmp = f"{pth}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(pth), exist_ok=True)
+            with open(tmp, "wb") as f:
+                np.save(f, np.ascontiguousarray(arr))
+            # A rewrite replaces the old entry, so only the difference counts towards the total.
+            try:
+                previous = os.path.getsize(pth)
+            except OSError:
+                previous = 0
+            os.replace(tmp, pth)
+            size = os.path.getsize(pth) - previous
+        except OSError as e:
+            print(f"Disk cache write failed for {pth}: {e}")
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            return
+        with self.lock:
+            if self.total_bytes is None:
+                self.total_bytes = sum(size for _, size, _ in self.scan())
+            else:
+                self.total_bytes += size
+            if self.total_bytes > self.max_bytes:
+                self.evict()
+
+    def scan(self):
+        entries = []
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                if not filename.endswith(".npy"):
+                    continue
+                pth = os.path.join(dirpath, filename)
+                try:
+                    st = os.stat(pth)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, pth))
+        return entries
+
+    def evict(self):
+        entries = sorted(self.scan())
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * 0.9
+        for _, size, pth in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(pth)
+                total -= size
+            except OSError:
+                pass
+        self.total_bytes = total
+
+    def clear(self):
+        with self.lock:
+            for _, _, pth in self.scan():
+                try:
+                    os.remove(pth)
+                except OSError:
+                    pass
+            self.total_bytes = 0
+
+
+disk_cache = DiskCache()
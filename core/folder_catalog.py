@@ -0,0 +1,230 @@
+import os
+import hashlib
+import sqlite3
+import warnings
+import rasterio
+from rasterio.errors import NotGeoreferencedWarning
+from core.disk_cache import default_cache_dir
+
+
+TIF_SUFFIXES = (".tif", ".tiff")
+
+SCHEMA_VERSION = 1
+
+HEADER_FIELDS = ("width", "height", "count", "dtype", "crs", "tiled", "block_width", "block_height",
+                 "compression", "overviews")
+
+SORT_KEYS = {
+    "Name": "rel COLLATE NOCASE",
+    "Modified": "mtime_ns",
+    "File size": "size",
+    "Pixels": "width * height",
+    "Bands": "count",
+}
+
+FILTER_COLUMNS = {"dtype": "dtype", "bands": "count", "crs": "crs"}
+
+
+def catalog_path(root):
+    digest = hashlib.sha1(os.path.abspath(root).encode("utf-8")).hexdigest()
+    return os.path.join(default_cache_dir(), "catalog", digest + ".sqlite")
+
+
+def read_header(pth):
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", NotGeoreferencedWarning)
+        with rasterio.open(pth) as dataset:
+            block_height, block_width = dataset.block_shapes[0]
+            return {
+                "width": dataset.width,
+                "height": dataset.height,
+                "count": dataset.count,
+                "dtype": dataset.dtypes[0],
+                "crs": dataset.crs.to_string() if dataset.crs else "",
+                "tiled": int(block_width < dataset.width),
+                "block_width": block_width,
+                "block_height": block_height,
+                "compression": dataset.compression.value if dataset.compression else "",
+                "overviews": len(dataset.overviews(1)),
+            }
+
+
+def walk_tifs(root, is_cancelled=None, folders=None):
+    # Depth-first with scandir; the entries carry their stat, so listing costs one call per folder.
+    # Given a dict, also fills it with {folder: (folder mtime_ns, {name: (mtime_ns, size)})} for the folder watcher.
+    stack = [root]
+    while stack:
+        if is_cancelled is not None and is_cancelled():
+            return
+        folder = stack.pop()
+        try:
+            # The folder's own mtime is taken before listing, so a later change shows up as a newer one.
+            folder_mtime = os.stat(folder).st_mtime_ns if folders is not None else None
+            entries = os.scandir(folder)
+        except OSError as e:
+            print(f"Cannot scan {folder}: {e}")
+            continue
+        names = {}
+        if folders is not None:
+            folders[folder] = (folder_mtime, names)
+        with entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if not entry.name.startswith("."):
+                            stack.append(entry.path)
+                    elif entry.name.lower().endswith(TIF_SUFFIXES) and entry.is_file():
+                        st = entry.stat()
+                        names[entry.name] = (st.st_mtime_ns, st.st_size)
+                        yield os.path.relpath(entry.path, root), st.st_mtime_ns, st.st_size
+                except OSError:
+                    continue
+
+
+def parse_filter(text):
+    # Plain words match the path; "dtype:uint16", "bands:3" and "crs:4326" match header fields.
+    clauses, params = [], []
+    for token in text.split():
+        field, sep, value = token.partition(":")
+        column = FILTER_COLUMNS.get(field.lower()) if sep else None
+        if column == "count":
+            try:
+                params.append(int(value))
+            except ValueError:
+                continue
+            clauses.append("count = ?")
+        elif column is not None:
+            clauses.append(f"{column} LIKE ?")
+            params.append(f"%{value}%")
+        else:
+            clauses.append("rel LIKE ?")
+            params.append(f"%{token}%")
+    return clauses, params
+
+
+class FolderCatalog:
+    def __init__(self, root, db_path=None):
+        self.root = os.path.abspath(root)
+        self.db_path = db_path if db_path is not None else catalog_path(self.root)
+        self.conn = None
+
+    def connect(self):
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        # WAL lets the viewer query while the scanner is writing.
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        if conn.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+            conn.execute("DROP TABLE IF EXISTS files")
+            conn.execute("PRAGMA user_version = %d" % SCHEMA_VERSION)
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            "rel TEXT PRIMARY KEY, mtime_ns INTEGER, size INTEGER, "
+            "width INTEGER, height INTEGER, count INTEGER, dtype TEXT, crs TEXT, tiled INTEGER, "
+            "block_width INTEGER, block_height INTEGER, compression TEXT, overviews INTEGER, "
+            "error TEXT, indexed INTEGER DEFAULT 0)")
+        conn.commit()
+        return conn
+
+    def connection(self):
+        # Used from the GUI thread only; the scanner opens its own.
+        if self.conn is None:
+            self.conn = self.connect()
+        return self.conn
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    def scan(self, is_cancelled=None, listed=None, progress=None, batch=200, folders=None):
+        conn = self.connect()
+        try:
+            return self.scan_with(conn, is_cancelled, listed, progress, batch, folders)
+        finally:
+            conn.close()
+
+    def scan_with(self, conn, is_cancelled, listed, progress, batch, folders=None):
+        known = {rel: (mtime_ns, size) for rel, mtime_ns, size in conn.execute("SELECT rel, mtime_ns, size FROM files")}
+        added, changed, seen = [], [], set()
+        for rel, mtime_ns, size in walk_tifs(self.root, is_cancelled, folders):
+            seen.add(rel)
+            previous = known.get(rel)
+            if previous is None:
+                added.append((rel, mtime_ns, size))
+            elif previous != (mtime_ns, size):
+                changed.append((mtime_ns, size, rel))
+        if is_cancelled is not None and is_cancelled():
+            return None
+        removed = [(rel,) for rel in known if rel not in seen]
+        with conn:
+            # A file the folder watcher added meanwhile keeps its row.
+            conn.executemany("INSERT OR IGNORE INTO files (rel, mtime_ns, size) VALUES (?, ?, ?)", added)
+            conn.executemany(
+                "UPDATE files SET mtime_ns = ?, size = ?, indexed = 0, error = NULL WHERE rel = ?", changed)
+            conn.executemany("DELETE FROM files WHERE rel = ?", removed)
+        stats = {"files": len(seen), "added": len(added), "changed": len(changed), "removed": len(removed)}
+        if listed is not None:
+            listed(stats)
+
+        # Headers are read after the listing is saved, so the file list is usable long before a large
+        # archive is fully indexed.
+        pending = [rel for rel, in conn.execute("SELECT rel FROM files WHERE indexed = 0 ORDER BY rel")]
+        updates = []
+        for done, rel in enumerate(pending, 1):
+            if is_cancelled is not None and is_cancelled():
+                break
+            updates.append(self.header_row(rel))
+            if len(updates) >= batch or done == len(pending):
+                self.save_headers(conn, updates)
+                updates = []
+                if progress is not None:
+                    progress(done, len(pending))
+        self.save_headers(conn, updates)
+        stats["indexed"] = len(pending)
+        return stats
+
+    def header_row(self, rel):
+        try:
+            header = read_header(os.path.join(self.root, rel))
+        except Exception as e:
+            return (None,) * len(HEADER_FIELDS) + (str(e), rel)
+        return tuple(header[field] for field in HEADER_FIELDS) + (None, rel)
+
+    def save_headers(self, conn, rows):
+        if not rows:
+            return
+        assignments = ", ".join(f"{field} = ?" for field in HEADER_FIELDS)
+        with conn:
+            conn.executemany(f"UPDATE files SET {assignments}, error = ?, indexed = 1 WHERE rel = ?", rows)
+
+    def update_files(self, files):
+        # [(rel, mtime_ns, size, header or None, error)], for files whose headers were read elsewhere.
+        rows = []
+        for rel, mtime_ns, size, header, error in files:
+            values = tuple(header[field] for field in HEADER_FIELDS) if header is not None else (None,) * len(HEADER_FIELDS)
+            rows.append((rel, mtime_ns, size) + values + (error,))
+        columns = ", ".join(("rel", "mtime_ns", "size") + HEADER_FIELDS + ("error",))
+        placeholders = ", ".join("?" * (len(HEADER_FIELDS) + 4))
+        with self.connection() as conn:
+            conn.executemany(f"INSERT OR REPLACE INTO files ({columns}, indexed) VALUES ({placeholders}, 1)", rows)
+
+    def remove_files(self, rels):
+        with self.connection() as conn:
+            conn.executemany("DELETE FROM files WHERE rel = ?", [(rel,) for rel in rels])
+
+    def query(self, sort="Name", descending=False, text=""):
+        clauses, params = parse_filter(text)
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        order = "DESC" if descending else "ASC"
+        # Files whose headers are not read yet sort last, whichever the direction.
+        key = SORT_KEYS.get(sort, SORT_KEYS["Name"])
+        sql = f"SELECT rel FROM files{where} ORDER BY {key} IS NULL, {key} {order}, rel COLLATE NOCASE"
+        return [rel for rel, in self.connection().execute(sql, params)]
+
+    def header(self, rel):
+        row = self.connection().execute(
+            f"SELECT {', '.join(HEADER_FIELDS)}, error, indexed FROM files WHERE rel = ?", (rel,)).fetchone()
+        if row is None or not row[-1] or row[-2] is not None:
+            return None
+        return dict(zip(HEADER_FIELDS, row))
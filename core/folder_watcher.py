@@ -0,0 +1,223 @@
+import os
+import time
+from PyQt6.QtCore import QObject, QFileSystemWatcher, QTimer, pyqtSignal
+from core.folder_catalog import TIF_SUFFIXES, read_header
+
+
+def list_folder(folder):
+    files, folders = {}, []
+    try:
+        entries = os.scandir(folder)
+    except OSError:
+        return None, []
+    with entries:
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if not entry.name.startswith("."):
+                        folders.append(entry.path)
+                elif entry.name.lower().endswith(TIF_SUFFIXES) and entry.is_file():
+                    st = entry.stat()
+                    files[entry.name] = (st.st_mtime_ns, st.st_size)
+            except OSError:
+                continue
+    return files, folders
+
+
+class FolderWatcher(QObject):
+    ready = pyqtSignal(object)  # [(rel, mtime_ns, size, header, error)]
+    removed = pyqtSignal(object)  # [rel]
+    rescan = pyqtSignal()  # wants a fresh snapshot from the catalog scanner
+
+    def __init__(self, parent=None, settle=1.0, give_up=30.0, poll_interval=250, max_watched=2000,
+                 rescan_interval=30000):
+        super().__init__(parent)
+        self.settle = settle
+        self.give_up = give_up
+        # inotify watches are a per-user budget shared with every other program; deeper folders
+        # past the cap are picked up by periodic rescans instead.
+        self.max_watched = max_watched
+        self.root = None
+        self.watcher = None
+        self.folders = {}  # {folder: {name: (mtime_ns, size)}} for files that are complete
+        self.watched = set()
+        self.pending = {}  # {path: [mtime_ns, size, stable since, first seen]}
+        self.dirty = set()
+        self.scan_timer = QTimer(self)
+        self.scan_timer.setSingleShot(True)
+        self.scan_timer.setInterval(100)
+        self.scan_timer.timeout.connect(self.scan_dirty)
+        self.poll_timer = QTimer(self)
+        self.poll_timer.setInterval(poll_interval)
+        self.poll_timer.timeout.connect(self.poll_pending)
+        self.rescan_timer = QTimer(self)
+        self.rescan_timer.setInterval(rescan_interval)
+        self.rescan_timer.timeout.connect(lambda: self.rescan.emit())
+
+    @property
+    def active(self):
+        return self.root is not None
+
+    def start(self, root):
+        # Nothing is watched until load_snapshot hands over the catalog scanner's listing.
+        self.stop()
+        self.root = os.path.abspath(root)
+        self.watcher = QFileSystemWatcher(self)
+        self.watcher.directoryChanged.connect(self.on_directory_changed)
+
+    def stop(self):
+        if self.watcher is not None:
+            self.watcher.deleteLater()
+            self.watcher = None
+        self.root = None
+        self.folders.clear()
+        self.watched.clear()
+        self.pending.clear()
+        self.dirty.clear()
+        self.scan_timer.stop()
+        self.poll_timer.stop()
+        self.rescan_timer.stop()
+
+    def rel(self, pth):
+        return os.path.relpath(pth, self.root)
+
+    def pending_files(self):
+        return {self.rel(pth) for pth in self.pending}
+
+    def load_snapshot(self, folders):
+        # {folder: (folder mtime_ns, {name: (mtime_ns, size)})} from walk_tifs. Watched folders are kept
+        # current by their own events; the snapshot fills in the rest.
+        if self.watcher is None:
+            return
+        # Files changed within the settle time may still be written, so they start out pending.
+        recent = time.time_ns() - int(self.settle * 2e9)
+        for folder in [f for f in self.folders if f not in folders and f not in self.watched]:
+            self.drop_folder(folder)
+        pending = {}
+        for pth in self.pending:
+            pending.setdefault(os.path.dirname(pth), set()).add(os.path.basename(pth))
+        for folder, (_, files) in folders.items():
+            if folder in self.watched:
+                continue
+            # The snapshot's dict is handed over as is; only the few pending files are taken out of it.
+            writing = pending.get(folder, set())
+            for name in [n for n, (mtime_ns, _) in files.items() if mtime_ns > recent or n in writing]:
+                mtime_ns, size = files.pop(name)
+                if name not in writing:
+                    self.add_pending(os.path.join(folder, name), mtime_ns, size)
+            self.folders[folder] = files
+        # Shallow folders first: that is where new captures usually land.
+        unwatched = sorted((f for f in self.folders if f not in self.watched), key=lambda f: (f.count(os.sep), f))
+        watch = unwatched[:max(0, self.max_watched - len(self.watched))]
+        if watch:
+            failed = set(self.watcher.addPaths(watch))
+            for folder in watch:
+                if folder in failed:
+                    continue
+                self.watched.add(folder)
+                # A change between the scanner's listing and the watch starting has no event of its own.
+                try:
+                    if os.stat(folder).st_mtime_ns != folders[folder][0]:
+                        self.dirty.add(folder)
+                except OSError:
+                    self.dirty.add(folder)
+            if self.dirty:
+                self.scan_timer.start()
+        if len(self.watched) < len(self.folders):
+            if not self.rescan_timer.isActive():
+                self.rescan_timer.start()
+        else:
+            self.rescan_timer.stop()
+
+    def add_pending(self, pth, mtime_ns, size):
+        now = time.monotonic()
+        self.pending[pth] = [mtime_ns, size, now, now]
+        if not self.poll_timer.isActive():
+            self.poll_timer.start()
+
+    def on_directory_changed(self, folder):
+        # Copies and renames fire several times in a row; one rescan per burst is enough.
+        self.dirty.add(folder)
+        self.scan_timer.start()
+
+    def scan_dirty(self):
+        if self.watcher is None:
+            return
+        dirty, self.dirty = self.dirty, set()
+        removed, new_folders = [], False
+        for folder in dirty:
+            known = self.folders.get(folder)
+            if known is None:
+                continue
+            files, subfolders = list_folder(folder)
+            if files is None:
+                removed.extend(self.drop_folder(folder))
+                continue
+            # A new folder may arrive with a whole tree inside; the catalog scanner lists it.
+            new_folders = new_folders or any(subfolder not in self.folders for subfolder in subfolders)
+            for subfolder in [f for f in self.folders if os.path.dirname(f) == folder and f not in subfolders]:
+                removed.extend(self.drop_folder(subfolder))
+            for name in list(known):
+                if name not in files:
+                    del known[name]
+                    removed.append(self.rel(os.path.join(folder, name)))
+            for name, (mtime_ns, size) in files.items():
+                pth = os.path.join(folder, name)
+                if pth in self.pending:
+                    continue
+                if known.get(name) != (mtime_ns, size):
+                    # New, or rewritten in place: either way it is not readable until the writer is done.
+                    known.pop(name, None)
+                    self.add_pending(pth, mtime_ns, size)
+            for pth in [p for p in self.pending if os.path.dirname(p) == folder and os.path.basename(p) not in files]:
+                del self.pending[pth]
+        if removed:
+            self.removed.emit(removed)
+        if new_folders:
+            self.rescan.emit()
+
+    def drop_folder(self, folder):
+        removed = []
+        prefix = os.path.join(folder, "")
+        for current in [f for f in self.folders if f == folder or f.startswith(prefix)]:
+            removed.extend(self.rel(os.path.join(current, name)) for name in self.folders.pop(current))
+            if current in self.watched:
+                self.watched.discard(current)
+                self.watcher.removePath(current)
+        for pth in [p for p in self.pending if p.startswith(prefix)]:
+            del self.pending[pth]
+        return removed
+
+    def poll_pending(self):
+        now = time.monotonic()
+        ready = []
+        for pth, state in list(self.pending.items()):
+            try:
+                st = os.stat(pth)
+            except OSError:
+                del self.pending[pth]
+                continue
+            if (st.st_mtime_ns, st.st_size) != (state[0], state[1]):
+                state[0], state[1], state[2] = st.st_mtime_ns, st.st_size, now
+                continue
+            if now - state[2] < self.settle:
+                continue
+            # Unchanged for the settle time; a header that opens is the last check that the file is whole.
+            try:
+                if st.st_size == 0:
+                    raise OSError("empty file")
+                header, error = read_header(pth), None
+            except Exception as e:
+                if now - state[3] < self.give_up:
+                    state[2] = now
+                    continue
+                header, error = None, str(e)
+            del self.pending[pth]
+            folder = self.folders.get(os.path.dirname(pth))
+            if folder is not None:
+                folder[os.path.basename(pth)] = (st.st_mtime_ns, st.st_size)
+            ready.append((self.rel(pth), st.st_mtime_ns, st.st_size, header, error))
+        if not self.pending:
+            self.poll_timer.stop()
+        if ready:
+            self.ready.emit(ready)
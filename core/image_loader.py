@@ -0,0 +1,103 @@
+from PyQt6.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+from core.prefetch import prepare_image, exact_display_range
+
+
+class LoadSignals(QObject):
+    # Each carries the task that produced it, so a late result from a cancelled task is told apart
+    # from the current one even for the same path.
+    progress = pyqtSignal(object, int, str)
+    loaded = pyqtSignal(object, object)
+    failed = pyqtSignal(object, str)
+    ranged = pyqtSignal(object, object)  # exact display range
+
+
+class LoadTask(QRunnable):
+    def __init__(self, pth, view_size, signals, selection=None):
+        super().__init__()
+        self.setAutoDelete(False)
+        self.path = pth
+        self.view_size = view_size
+        self.selection = selection
+        self.signals = signals
+        self.cancelled = False
+
+    def report(self, percent, message):
+        if not self.cancelled:
+            self.signals.progress.emit(self, percent, message)
+
+    def run(self):
+        if self.cancelled:
+            return
+        try:
+            prepared = prepare_image(self.path, *self.view_size,
+                                     is_cancelled=lambda: self.cancelled, progress=self.report,
+                                     selection=self.selection)
+        except Exception as e:
+            if not self.cancelled:
+                self.signals.failed.emit(self, str(e))
+            return
+        if prepared is not None and not self.cancelled:
+            self.signals.loaded.emit(self, prepared)
+
+
+class StatsTask(QRunnable):
+    # The full statistics pass, after the preview is already up.
+    def __init__(self, pth, selection, signals):
+        super().__init__()
+        self.setAutoDelete(False)
+        self.path = pth
+        self.selection = selection
+        self.signals = signals
+        self.cancelled = False
+
+    def report(self, done):
+        if not self.cancelled:
+            self.signals.progress.emit(self, int(100 * done), "computing statistics")
+
+    def run(self):
+        if self.cancelled:
+            return
+        try:
+            display_range = exact_display_range(self.path, self.selection,
+                                                is_cancelled=lambda: self.cancelled, progress=self.report)
+        except Exception as e:
+            print(f"Statistics failed for {self.path}: {e}")
+            return
+        if display_range is not None and not self.cancelled:
+            self.signals.ranged.emit(self, display_range)
+
+
+class ImageLoader(QObject):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(2)
+        self.signals = LoadSignals()
+        self.task = None
+        self.stats_task = None
+
+    def load(self, pth, view_size, selection=None):
+        self.cancel()
+        self.task = LoadTask(pth, view_size, self.signals, selection)
+        self.pool.start(self.task)
+
+    def load_stats(self, pth, selection):
+        self.cancel_stats()
+        self.stats_task = StatsTask(pth, selection, self.signals)
+        self.pool.start(self.stats_task)
+
+    def is_current(self, task):
+        return task in (self.task, self.stats_task) and not task.cancelled
+
+    def cancel(self):
+        if self.task is not None:
+            self.task.cancelled = True
+            self.pool.tryTake(self.task)
+            self.task = None
+        self.cancel_stats()
+
+    def cancel_stats(self):
+        if self.stats_task is not None:
+            self.stats_task.cancelled = True
+            self.pool.tryTake(self.stats_task)
+            self.stats_task = None
@@ -0,0 +1,143 @@
+from PyQt6.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+from core.raster_source import RasterSource
+from core.pyramid import RasterPyramid
+from core.raster_stats import cached_stats, get_raster_stats, sample_display_range
+from utils.lru_cache import LRUCache
+from utils.instrumentation import instrumentation
+
+
+class PreparedImage:
+    def __init__(self, path, selection, display_range, exact, factor, tile_size, levels, tiles):
+        self.path = path
+        self.selection = selection
+        self.display_range = display_range
+        self.exact = exact  # False while the range comes from a sample; see exact_display_range
+        self.factor = factor
+        self.tile_size = tile_size
+        self.levels = levels  # {factor: raw decimated level}
+        self.tiles = tiles  # {(tx, ty): (window, uint8 tile)}
+
+    @property
+    def nbytes(self):
+        total = sum(level.nbytes for level in self.levels.values())
+        return total + sum(img.nbytes for _, img in self.tiles.values())
+
+
+def prepare_image(pth, view_width, view_height, is_cancelled=None, progress=None, selection=None):
+    with instrumentation.span("prepare_image"):
+        if progress is not None:
+            progress(0, "reading header")
+        source = RasterSource(pth)
+        try:
+            if selection is not None:
+                source.set_selection(selection)
+            pyramid = RasterPyramid(source)
+            stats = cached_stats(source)
+            if stats is not None:
+                display_range = stats.display_range()
+            else:
+                # Exact statistics read every pixel (twice for floats); the preview is stretched with a
+                # coarse level's range instead and the viewer applies the exact one when it is ready.
+                if progress is not None:
+                    progress(10, "sampling display range")
+                with instrumentation.span("sample_range"):
+                    display_range = sample_display_range(source, pyramid.sample_level())
+            source.display_range = display_range
+            scale = min(view_width / source.width, view_height / source.height)
+            factor = pyramid.level_for_scale(scale)
+            tile_size = source.preferred_tile_size()
+            cols, rows = pyramid.tile_grid(factor, tile_size)
+            tiles = {}
+            for ty in range(rows):
+                for tx in range(cols):
+                    if is_cancelled is not None and is_cancelled():
+                        return None
+                    if progress is not None:
+                        progress(30 + 70 * len(tiles) // (cols * rows), "building preview")
+                    tiles[(tx, ty)] = pyramid.read_display_tile(factor, tx, ty, tile_size)
+            levels = {f: level for f, level in pyramid.decimated.items() if f >= factor}
+            return PreparedImage(pth, source.selection, display_range, stats is not None, factor, tile_size, levels, tiles)
+        finally:
+            source.close()
+
+
+def exact_display_range(pth, selection=None, is_cancelled=None, progress=None):
+    source = RasterSource(pth)
+    try:
+        if selection is not None:
+            source.set_selection(selection)
+        with instrumentation.span("stats"):
+            stats = get_raster_stats(source, is_cancelled=is_cancelled, progress=progress)
+        return None if stats is None else stats.display_range()
+    finally:
+        source.close()
+
+
+class PrefetchSignals(QObject):
+    finished = pyqtSignal(str, object)
+
+
+class PrefetchTask(QRunnable):
+    def __init__(self, pth, view_size):
+        super().__init__()
+        self.setAutoDelete(False)
+        self.path = pth
+        self.view_size = view_size
+        self.cancelled = False
+        self.signals = PrefetchSignals()
+
+    def run(self):
+        if self.cancelled:
+            return
+        try:
+            prepared = prepare_image(self.path, *self.view_size, is_cancelled=lambda: self.cancelled)
+        except Exception as e:
+            print(f"Prefetch failed for {self.path}: {e}")
+            prepared = None
+        if not self.cancelled:
+            self.signals.finished.emit(self.path, prepared)
+
+
+class Prefetcher(QObject):
+    def __init__(self, parent=None, max_bytes=512 * 1024 * 1024, max_workers=2):
+        super().__init__(parent)
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(max_workers)
+        self.cache = LRUCache(max_bytes, sizeof=lambda prepared: prepared.nbytes)
+        self.pending = {}
+
+    def get(self, pth):
+        return self.cache.get(pth)
+
+    def update(self, paths, view_size):
+        wanted = [p for p in paths if p not in self.cache]
+        for pth, task in list(self.pending.items()):
+            queued = self.pool.tryTake(task)
+            if pth not in wanted:
+                task.cancelled = True
+                del self.pending[pth]
+            elif not queued:
+                wanted.remove(pth)
+
+        for priority, pth in enumerate(reversed(wanted)):
+            task = self.pending.get(pth)
+            if task is None:
+                task = PrefetchTask(pth, view_size)
+                task.signals.finished.connect(self.on_finished)
+                self.pending[pth] = task
+            self.pool.start(task, priority)
+
+    def on_finished(self, pth, prepared):
+        task = self.pending.get(pth)
+        if task is None or task.cancelled:
+            return
+        del self.pending[pth]
+        if prepared is not None:
+            self.cache.put(pth, prepared)
+
+    def clear(self):
+        for task in self.pending.values():
+            self.pool.tryTake(task)
+            task.cancelled = True
+        self.pending.clear()
+        self.cache.clear()
@@ -0,0 +1,187 @@
+import os
+import hashlib
+import json
+import warnings
+from functools import lru_cache
+import numpy as np
+import cv2
+import rasterio
+from rasterio.errors import NotGeoreferencedWarning
+from core.raster_source import RasterSource, to_uint8
+from core.raster_stats import chunk_windows
+from core.band_math import BandSelection
+
+
+@lru_cache(maxsize=16)
+def log_lut(size, img_max):
+    values = np.arange(size, dtype=np.float32)
+    np.log1p(values, out=values)
+    values *= 255.0 / np.log(1 + img_max + 1e-10)
+    np.clip(values, 0, 255, out=values)
+    return values.astype(np.uint8)
+
+
+def log_transfer(img_arr, img_max=None, chunk_rows=None):
+    if img_max is None:
+        img_max = float(np.nanmax(img_arr)) if img_arr.size else 0.0
+    if not img_max > 1e-10:
+        return np.zeros(img_arr.shape, dtype=np.uint8)
+
+    if chunk_rows is not None and img_arr.shape[0] > chunk_rows:
+        log_img = np.empty(img_arr.shape, dtype=np.uint8)
+        for start in range(0, img_arr.shape[0], chunk_rows):
+            stop = start + chunk_rows
+            log_img[start:stop] = log_transfer(img_arr[start:stop], img_max)
+        return log_img
+
+    if img_arr.dtype == np.uint8:
+        return cv2.LUT(img_arr, log_lut(256, img_max))
+    if img_arr.dtype == np.uint16:
+        return np.take(log_lut(65536, img_max), img_arr)
+
+    log_img = img_arr.astype(np.float32)
+    if img_max > 1e10:
+        log_img *= 1000 / img_max
+        img_max = 1000
+    np.maximum(log_img, 0, out=log_img)
+    np.log1p(log_img, out=log_img)
+    log_img *= 255.0 / np.log(1 + img_max + 1e-10)
+    np.nan_to_num(log_img, copy=False, nan=0.0, posinf=255.0, neginf=0.0)
+    np.clip(log_img, 0, 255, out=log_img)
+    return log_img.astype(np.uint8)
+
+
+def scale_in_place(img, brightness, contrast, min_val, max_val, img_range):
+    lo, hi = img_range
+    img -= lo
+    img *= 1.0 / max(hi - lo, 1e-10)
+    if min_val > 0 or max_val < 1 and min_val!=max_val:
+        # Signed on purpose: a min above the max gives an inverted ramp. Only equal values are guarded.
+        span = max_val - min_val
+        img -= min_val
+        img *= 1.0 / (span if span != 0 else 1e-10)
+        np.clip(img, 0, 1, out=img)
+    img *= 255 * contrast
+    img += brightness
+    np.clip(img, 0, 255, out=img)
+
+
+def build_lut(brightness, contrast, min_val, max_val, img_range, size=256):
+    lut = np.arange(size, dtype=np.float32)
+    scale_in_place(lut, brightness, contrast, min_val, max_val, img_range)
+    return lut.astype(np.uint8)
+
+
+def apply_lut(img, lut):
+    if img.dtype == np.uint8:
+        return cv2.LUT(img, lut)
+    return np.take(lut, img)
+
+
+def apply_adjustments(img, brightness, contrast, min_val, max_val, img_range=None):
+    if img_range is None:
+        img_range = (float(np.nanmin(img)), float(np.nanmax(img)))
+    if img.dtype == np.uint8 or img.dtype == np.uint16:
+        size = 256 if img.dtype == np.uint8 else 65536
+        return apply_lut(img, build_lut(brightness, contrast, min_val, max_val, img_range, size))
+    out = img.astype(np.float32)
+    scale_in_place(out, brightness, contrast, min_val, max_val, img_range)
+    return np.nan_to_num(out, copy=False).astype(np.uint8)
+
+
+class ProcessOptions:
+    def __init__(self, log=False, brightness=0, contrast=1.0, min_val=0.0, max_val=1.0,
+                 bands=None, expression=None, compress="deflate", chunk_bytes=16 * 1024 * 1024):
+        self.log = log
+        self.brightness = brightness
+        self.contrast = contrast
+        self.min_val = min_val
+        self.max_val = max_val
+        self.bands = list(bands) if bands else None
+        self.expression = expression
+        self.compress = compress
+        self.chunk_bytes = chunk_bytes
+
+    @property
+    def adjusted(self):
+        return (self.brightness, self.contrast, self.min_val, self.max_val) != (0, 1.0, 0.0, 1.0)
+
+    def selection(self, count):
+        if self.bands is None and self.expression is None:
+            return None
+        selection = BandSelection(self.bands, self.expression)
+        selection.validate(count)
+        return selection
+
+    @property
+    def key(self):
+        # Everything that changes the output pixels; a resumed run must match it.
+        params = [self.log, self.brightness, self.contrast, self.min_val, self.max_val,
+                  self.bands, self.expression, self.compress]
+        return hashlib.sha1(json.dumps(params).encode("utf-8")).hexdigest()[:12]
+
+
+class ImagePipeline:
+    # Same steps as the viewer: display range stretch, optional log, then adjustments.
+    def __init__(self, source, options):
+        self.options = options
+        self.display_range = source.get_display_range()
+        lo, hi = self.display_range
+        self.image_range = (lo, hi) if source.dtype == np.uint8 else (0, 255)
+        if options.log:
+            log_range = log_transfer(np.array(self.image_range), img_max=self.image_range[1])
+            self.image_range = (int(log_range[0]), int(log_range[1]))
+
+    def apply(self, arr):
+        options = self.options
+        img = to_uint8(arr, *self.display_range)
+        if options.log:
+            img_max = self.display_range[1] if arr.dtype == np.uint8 else 255
+            img = log_transfer(img, img_max=img_max)
+        if not options.adjusted:
+            return img
+        return apply_adjustments(img, options.brightness, options.contrast,
+                                 options.min_val, options.max_val, self.image_range)
+
+
+def process_file(src, dst, options, progress=None):
+    source = RasterSource(src)
+    try:
+        selection = options.selection(source.count)
+        if selection is not None:
+            source.set_selection(selection)
+        pipeline = ImagePipeline(source, options)
+        count = 1 if source.selection.expression is not None else len(source.bands)
+        profile = {
+            "driver": "GTiff",
+            "width": source.width,
+            "height": source.height,
+            "count": count,
+            "dtype": "uint8",
+            "crs": source.dataset.crs,
+            "transform": source.dataset.transform,
+        }
+        if options.compress:
+            profile["compress"] = options.compress
+        if count == 3:
+            profile["photometric"] = "RGB"
+        # chunk_windows counts samples across all read bands; only the sample size is left to divide by.
+        windows = list(chunk_windows(source, max(1, options.chunk_bytes // np.dtype(source.dtype).itemsize)))
+        tmp = dst + ".partial"
+        os.makedirs(os.path.dirname(os.path.abspath(dst)), exist_ok=True)
+        try:
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore", NotGeoreferencedWarning)
+                out = rasterio.open(tmp, "w", **profile)
+            with out:
+                for i, window in enumerate(windows):
+                    img = pipeline.apply(source.read(window))
+                    out.write(img[None] if img.ndim == 2 else np.moveaxis(img, -1, 0), window=window)
+                    if progress is not None:
+                        progress((i + 1) / len(windows))
+            os.replace(tmp, dst)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+    finally:
+        source.close()
@@ -0,0 +1,121 @@
+import math
+import threading
+import numpy as np
+import cv2
+from rasterio.windows import Window
+from core.raster_source import to_uint8, display_key
+from core.disk_cache import disk_cache, entry_name
+from utils.instrumentation import instrumentation
+
+
+class RasterPyramid:
+    def __init__(self, source, max_level_pixels=4096 * 4096, min_level_size=256):
+        self.source = source
+        self.max_level_pixels = max_level_pixels
+        self.overview_factors = set(source.dataset.overviews(1))
+        self.levels = [1]
+        while max(source.width, source.height) / self.levels[-1] > min_level_size:
+            self.levels.append(self.levels[-1] * 2)
+        for factor in sorted(self.overview_factors):
+            if factor not in self.levels:
+                self.levels.append(factor)
+        self.levels.sort()
+        self.decimated = {}
+        self.lock = threading.Lock()
+
+    def level_for_scale(self, scale):
+        best = 1
+        for factor in self.levels:
+            if factor * scale <= 1.0:
+                best = factor
+        return best
+
+    def level_size(self, factor):
+        return math.ceil(self.source.width / factor), math.ceil(self.source.height / factor)
+
+    def is_in_memory(self, factor):
+        if factor == 1 or factor in self.overview_factors:
+            return False
+        width, height = self.level_size(factor)
+        return width * height <= self.max_level_pixels
+
+    def get_level(self, factor):
+        with self.lock:
+            return self.build_level(factor)
+
+    def build_level(self, factor):
+        if factor in self.decimated:
+            return self.decimated[factor]
+        name = entry_name("level", self.source.selection.key, factor)
+        level = disk_cache.get(self.source.cache_key, name)
+        if level is not None:
+            self.decimated[factor] = level
+            return level
+        width, height = self.level_size(factor)
+        finer = [f for f in self.decimated if f < factor and factor % f == 0]
+        if finer:
+            base = self.decimated[max(finer)]
+            level = cv2.resize(base, (width, height), interpolation=cv2.INTER_AREA)
+        else:
+            window = Window(0, 0, self.source.width, self.source.height)
+            level = self.source.read(window, out_shape=(height, width))
+        self.decimated[factor] = level
+        disk_cache.put(self.source.cache_key, name, level)
+        return level
+
+    def sample_level(self, max_pixels=1024 * 1024):
+        # The finest level small enough to read whole; overviews serve it when the file has them.
+        for factor in self.levels:
+            width, height = self.level_size(factor)
+            if width * height <= max_pixels:
+                break
+        if self.is_in_memory(factor):
+            return self.get_level(factor)
+        window = Window(0, 0, self.source.width, self.source.height)
+        return self.source.read(window, out_shape=(height, width))
+
+    def tile_grid(self, factor, tile_size):
+        width, height = self.level_size(factor)
+        return math.ceil(width / tile_size), math.ceil(height / tile_size)
+
+    def tile_bounds(self, factor, tx, ty, tile_size):
+        width, height = self.level_size(factor)
+        lx0, ly0 = tx * tile_size, ty * tile_size
+        return lx0, ly0, min(lx0 + tile_size, width), min(ly0 + tile_size, height)
+
+    def tile_window(self, factor, tx, ty, tile_size):
+        lx0, ly0, lx1, ly1 = self.tile_bounds(factor, tx, ty, tile_size)
+        if self.is_in_memory(factor):
+            width, height = self.level_size(factor)
+            sx = self.source.width / width
+            sy = self.source.height / height
+            return Window(lx0 * sx, ly0 * sy, (lx1 - lx0) * sx, (ly1 - ly0) * sy)
+        x0, y0 = lx0 * factor, ly0 * factor
+        return Window(x0, y0, min(lx1 * factor, self.source.width) - x0,
+                      min(ly1 * factor, self.source.height) - y0)
+
+    def read_tile(self, factor, tx, ty, tile_size):
+        lx0, ly0, lx1, ly1 = self.tile_bounds(factor, tx, ty, tile_size)
+        window = self.tile_window(factor, tx, ty, tile_size)
+        if self.is_in_memory(factor):
+            img = self.get_level(factor)[ly0:ly1, lx0:lx1]
+        else:
+            img = self.source.read(window, out_shape=(ly1 - ly0, lx1 - lx0))
+        return window, np.ascontiguousarray(img)
+
+    def read_display_tile(self, factor, tx, ty, tile_size, display_range=None):
+        # The range is passed in when the caller keyed its own cache by it, so both agree.
+        if display_range is None:
+            display_range = self.source.display_range
+        name = entry_name("tile", display_key(self.source.selection.key, display_range), factor, tx, ty, tile_size)
+        img = disk_cache.get(self.source.cache_key, name)
+        if img is not None:
+            return self.tile_window(factor, tx, ty, tile_size), img
+        window, img = self.read_tile(factor, tx, ty, tile_size)
+        with instrumentation.span("normalize"):
+            img = to_uint8(img, *display_range)
+        disk_cache.put(self.source.cache_key, name, img)
+        return window, img
+
+    def clear(self):
+        self.decimated.clear()
@@ -0,0 +1,248 @@
+import math
+import logging
+import threading
+import warnings
+from functools import lru_cache
+import numpy as np
+import rasterio
+from rasterio.enums import Interleaving
+from rasterio.errors import NotGeoreferencedWarning
+from rasterio.windows import Window
+from core.raster_stats import get_raster_stats
+from core.disk_cache import file_key
+from core.band_math import default_selection
+from utils.instrumentation import instrumentation
+
+log = logging.getLogger(__name__)
+
+
+class RasterSource:
+    def __init__(self, pth):
+        self.path = pth
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.handles = []
+        self.active_reads = 0
+        self.closed = False
+        self.width = self.dataset.width
+        self.height = self.dataset.height
+        self.count = self.dataset.count
+        self.band_dtype = np.dtype(self.dataset.dtypes[0])
+        self.band_nodata = self.dataset.nodata
+        self.block_height, self.block_width = self.dataset.block_shapes[0]
+        self.selection = default_selection(self.count)
+        self.display_range = None
+        self.cache_key = file_key(pth)
+        self.mapped = map_uncompressed(self.dataset)
+
+    @property
+    def bands(self):
+        return self.selection.read_bands
+
+    @property
+    def dtype(self):
+        return self.selection.output_dtype(self.band_dtype)
+
+    @property
+    def nodata(self):
+        # Band math turns nodata into NaN before evaluating.
+        return None if self.selection.expression is not None else self.band_nodata
+
+    def set_selection(self, selection):
+        selection.validate(self.count)
+        self.selection = selection
+        self.display_range = None
+
+    @property
+    def dataset(self):
+        dataset = getattr(self.local, "dataset", None)
+        if dataset is None:
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore", NotGeoreferencedWarning)
+                dataset = rasterio.open(self.path)
+            self.local.dataset = dataset
+            with self.lock:
+                self.handles.append(dataset)
+        return dataset
+
+    def block_aligned_window(self, x0, y0, x1, y1):
+        x0 = max(0, int(x0) // self.block_width * self.block_width)
+        y0 = max(0, int(y0) // self.block_height * self.block_height)
+        x1 = min(self.width, math.ceil(x1 / self.block_width) * self.block_width)
+        y1 = min(self.height, math.ceil(y1 / self.block_height) * self.block_height)
+        return Window(x0, y0, max(0, x1 - x0), max(0, y1 - y0))
+
+    def read(self, window, out_shape=None):
+        if out_shape is not None:
+            out_shape = (len(self.bands),) + tuple(out_shape)
+        with self.lock:
+            if self.closed:
+                raise ValueError(f"Raster source is closed: {self.path}")
+            self.active_reads += 1
+        try:
+            with instrumentation.span("decode"):
+                if self.mapped is not None:
+                    arr = self.read_mapped(window, out_shape)
+                else:
+                    arr = self.dataset.read(self.bands, window=window, out_shape=out_shape)
+                    arr = arr[0] if arr.shape[0] == 1 else np.ascontiguousarray(np.moveaxis(arr, 0, -1))
+        finally:
+            with self.lock:
+                self.active_reads -= 1
+                if self.closed and self.active_reads == 0:
+                    self.close_handles()
+        return self.selection.apply(arr, self.band_nodata)
+
+    def read_mapped(self, window, out_shape=None):
+        if window is None:
+            window = Window(0, 0, self.width, self.height)
+        x0 = min(self.width, max(0, int(round(window.col_off))))
+        y0 = min(self.height, max(0, int(round(window.row_off))))
+        x1 = min(self.width, x0 + int(round(window.width)))
+        y1 = min(self.height, y0 + int(round(window.height)))
+        bands = band_index(self.bands)
+        if out_shape is not None:
+            # Nearest-neighbour sampling, matching rasterio's default resampling.
+            rows = sample_index(y0, y1, out_shape[1])
+            cols = sample_index(x0, x1, out_shape[2])
+            if self.mapped.ndim == 3:
+                arr = self.mapped[rows[:, None], cols[None, :]]
+            else:
+                bh, bw = self.block_height, self.block_width
+                arr = self.mapped[(rows // bh)[:, None], (cols // bw)[None, :],
+                                  (rows % bh)[:, None], (cols % bw)[None, :]]
+            arr = arr[..., bands]
+        elif self.mapped.ndim == 3:
+            arr = self.mapped[y0:y1, x0:x1, bands]
+        else:
+            arr = self.read_mapped_tiles(x0, y0, x1, y1, bands)
+        if not arr.dtype.isnative:
+            arr = arr.astype(arr.dtype.newbyteorder("="))
+        if arr.shape[-1] == 1:
+            return arr[..., 0]
+        return arr
+
+    def read_mapped_tiles(self, x0, y0, x1, y1, bands):
+        # Bands are picked in a second step: mixing the tile indices with a band
+        # list in one subscript would move the band axis to the front.
+        bh, bw = self.block_height, self.block_width
+        if x1 <= x0 or y1 <= y0:
+            return self.mapped[0, 0, 0:y1 - y0, 0:x1 - x0][..., bands]
+        tiles = [(ty, tx) for ty in range(y0 // bh, (y1 - 1) // bh + 1)
+                 for tx in range(x0 // bw, (x1 - 1) // bw + 1)]
+        if len(tiles) == 1:
+            ty, tx = tiles[0]
+            return self.mapped[ty, tx, y0 - ty * bh:y1 - ty * bh, x0 - tx * bw:x1 - tx * bw][..., bands]
+        first = self.mapped[0, 0, 0:1, 0:1][..., bands]
+        arr = np.empty((y1 - y0, x1 - x0, first.shape[-1]), dtype=first.dtype)
+        for ty, tx in tiles:
+            sy0, sy1 = max(y0, ty * bh), min(y1, (ty + 1) * bh)
+            sx0, sx1 = max(x0, tx * bw), min(x1, (tx + 1) * bw)
+            arr[sy0 - y0:sy1 - y0, sx0 - x0:sx1 - x0] = \
+                self.mapped[ty, tx, sy0 - ty * bh:sy1 - ty * bh, sx0 - tx * bw:sx1 - tx * bw][..., bands]
+        return arr
+
+    def preferred_tile_size(self):
+        if self.block_width < self.width and 256 <= self.block_width <= 1024:
+            return self.block_width
+        return 512
+
+    def get_display_range(self):
+        if self.display_range is None:
+            self.display_range = get_raster_stats(self).display_range()
+        return self.display_range
+
+    def close(self):
+        with self.lock:
+            self.closed = True
+            if self.active_reads == 0:
+                self.close_handles()
+
+    def close_handles(self):
+        for dataset in self.handles:
+            dataset.close()
+        self.handles.clear()
+        self.mapped = None
+
+
+def block_offset(dataset, col, row):
+    value = dataset.get_tag_item(f"BLOCK_OFFSET_{col}_{row}", "TIFF", bidx=1)
+    return int(value) if value else None
+
+
+def map_uncompressed(dataset, max_checks=64):
+    # Uncompressed, pixel-interleaved TIFFs whose blocks are stored back to back
+    # can be read straight from a memory map instead of through GDAL.
+    if dataset.driver != "GTiff" or dataset.compression is not None:
+        return None
+    if dataset.count > 1 and dataset.interleaving != Interleaving.pixel:
+        return None
+    if dataset.tags(ns="IMAGE_STRUCTURE").get("NBITS") or len(set(dataset.dtypes)) != 1:
+        return None
+    bh, bw = dataset.block_shapes[0]
+    rows = math.ceil(dataset.height / bh)
+    cols = math.ceil(dataset.width / bw)
+    dtype = np.dtype(dataset.dtypes[0])
+    if dtype.kind not in "uif":
+        return None
+    block_bytes = bh * bw * dataset.count * dtype.itemsize
+    try:
+        base = block_offset(dataset, 0, 0)
+        if base is None:
+            return None
+        step = max(1, rows * cols // max_checks)
+        for i in list(range(0, rows * cols, step)) + [rows * cols - 1]:
+            if block_offset(dataset, i % cols, i // cols) != base + i * block_bytes:
+                return None
+        with open(dataset.name, "rb") as f:
+            byteorder = "<" if f.read(2) == b"II" else ">"
+        dtype = dtype.newbyteorder(byteorder)
+        if bw == dataset.width:
+            shape = (dataset.height, dataset.width, dataset.count)
+        else:
+            shape = (rows, cols, bh, bw, dataset.count)
+        return np.memmap(dataset.name, dtype=dtype, mode="r", offset=base, shape=shape)
+    except (OSError, ValueError) as e:
+        log.info("Falling back to GDAL reads for %s: %s", dataset.name, e)
+        return None
+
+
+def band_index(bands):
+    indices = [b - 1 for b in bands]
+    if indices == list(range(indices[0], indices[-1] + 1)):
+        return slice(indices[0], indices[-1] + 1)
+    return indices
+
+
+def sample_index(start, stop, size):
+    index = start + ((np.arange(size) + 0.5) * ((stop - start) / size)).astype(np.intp)
+    return np.minimum(index, stop - 1)
+
+
+def display_key(selection_key, display_range):
+    # Display tiles depend on the stretch as well as the bands; the range changes once exact stats arrive.
+    lo, hi = display_range
+    return f"{selection_key}_{lo:.6g}_{hi:.6g}"
+
+
+@lru_cache(maxsize=8)
+def display_lut(lo, hi):
+    values = np.arange(65536, dtype=np.float32)
+    values -= lo
+    values *= 255.0 / (hi - lo)
+    np.clip(values, 0, 255, out=values)
+    return values.astype(np.uint8)
+
+
+def to_uint8(img, lo, hi):
+    if img.dtype == np.uint8:
+        return img
+    if hi <= lo:
+        return np.zeros(img.shape, dtype=np.uint8)
+    if img.dtype == np.uint16:
+        return np.take(display_lut(lo, hi), img)
+    out = img.astype(np.float32)
+    out -= lo
+    out *= 255.0 / (hi - lo)
+    np.clip(out, 0, 255, out=out)
+    return np.nan_to_num(out, copy=False).astype(np.uint8)
@@ -0,0 +1,169 @@
+import numpy as np
+from rasterio.windows import Window
+from utils.lru_cache import LRUCache
+from core.disk_cache import disk_cache, entry_name
+
+
+DISPLAY_PERCENTILES = (0.5, 99.5)
+
+stats_cache = LRUCache(64 * 1024 * 1024, sizeof=lambda stats: stats.nbytes)
+
+
+class RasterStats:
+    def __init__(self, dtype, minimum, maximum, hist, edges, valid_count, invalid_count):
+        self.dtype = dtype
+        self.minimum = minimum
+        self.maximum = maximum
+        self.hist = hist
+        self.edges = edges
+        self.valid_count = valid_count
+        self.invalid_count = invalid_count
+
+    @property
+    def nbytes(self):
+        return self.hist.nbytes + self.edges.nbytes
+
+    def percentile(self, q):
+        if self.valid_count == 0:
+            return self.minimum
+        cdf = np.cumsum(self.hist)
+        target = q / 100.0 * self.valid_count
+        idx = min(int(np.searchsorted(cdf, target, side='left')), len(self.hist) - 1)
+        below = cdf[idx - 1] if idx > 0 else 0
+        frac = (target - below) / self.hist[idx] if self.hist[idx] else 0.0
+        value = self.edges[idx] + frac * (self.edges[idx + 1] - self.edges[idx])
+        return float(min(max(value, self.minimum), self.maximum))
+
+    def display_range(self, percentiles=DISPLAY_PERCENTILES):
+        # uint8 is shown as-is, so its range is only used by the adjustment sliders.
+        if self.dtype == np.uint8:
+            return self.minimum, self.maximum
+        lo, hi = (self.percentile(q) for q in percentiles)
+        if hi <= lo:
+            return self.minimum, self.maximum
+        return lo, hi
+
+
+def chunk_windows(source, chunk_pixels):
+    rows = max(1, chunk_pixels // max(1, source.width * len(source.bands)))
+    rows = max(source.block_height, rows // source.block_height * source.block_height)
+    for row in range(0, source.height, rows):
+        yield Window(0, row, source.width, min(rows, source.height - row))
+
+
+def valid_values(source, window):
+    values = source.read(window).ravel()
+    if values.dtype.kind == 'f':
+        mask = np.isfinite(values)
+    else:
+        mask = None
+    if source.nodata is not None and not np.isnan(source.nodata):
+        nodata_mask = values != source.nodata
+        mask = nodata_mask if mask is None else mask & nodata_mask
+    if mask is None:
+        return values, 0
+    return values[mask], int(values.size - np.count_nonzero(mask))
+
+
+def compute_stats(source, bins=4096, chunk_pixels=1024 * 1024, is_cancelled=None, progress=None):
+    windows = list(chunk_windows(source, chunk_pixels))
+    exact = source.dtype in (np.uint8, np.uint16)
+    # Exact integer histograms need one pass; everything else needs min/max first.
+    passes = [windows] if exact else [windows, windows]
+    total = sum(len(p) for p in passes)
+    done = 0
+
+    minimum, maximum = np.inf, -np.inf
+    valid_count = invalid_count = 0
+    hist = np.zeros(256 if source.dtype == np.uint8 else 65536 if exact else bins, dtype=np.int64)
+    edges = np.arange(len(hist) + 1, dtype=np.float64) if exact else None
+
+    for pass_index, pass_windows in enumerate(passes):
+        for window in pass_windows:
+            if is_cancelled is not None and is_cancelled():
+                return None
+            values, invalid = valid_values(source, window)
+            if exact:
+                hist += np.bincount(values, minlength=len(hist))
+            elif pass_index == 1:
+                chunk_hist, _ = np.histogram(values, bins=bins, range=(edges[0], edges[-1]))
+                hist += chunk_hist
+            if pass_index == 0:
+                valid_count += values.size
+                invalid_count += invalid
+                if values.size:
+                    minimum = min(minimum, float(values.min()))
+                    maximum = max(maximum, float(values.max()))
+            done += 1
+            if progress is not None:
+                progress(done / total)
+        if pass_index == 0 and not exact:
+            if valid_count == 0:
+                break
+            edges = np.linspace(minimum, maximum if maximum > minimum else minimum + 1, bins + 1)
+
+    if valid_count == 0:
+        minimum = maximum = 0.0
+        edges = np.arange(len(hist) + 1, dtype=np.float64)
+    return RasterStats(source.dtype, minimum, maximum, hist, edges, valid_count, invalid_count)
+
+
+def sample_range(img, nodata, percentiles=DISPLAY_PERCENTILES):
+    values = img.ravel()
+    if values.dtype.kind == 'f':
+        values = values[np.isfinite(values)]
+    if nodata is not None and not np.isnan(nodata):
+        values = values[values != nodata]
+    if values.size == 0:
+        return 0.0, 1.0
+    lo, hi = (float(v) for v in np.percentile(values, percentiles))
+    if hi <= lo:
+        lo, hi = float(values.min()), float(values.max())
+    return lo, hi
+
+
+def sample_display_range(source, img):
+    # Same rule as RasterStats.display_range, from a decimated read instead of every pixel.
+    return sample_range(img, source.nodata, (0, 100) if source.dtype == np.uint8 else DISPLAY_PERCENTILES)
+
+
+def load_stats(source):
+    name = entry_name("stats", source.selection.key)
+    meta = disk_cache.get(source.cache_key, name + "_meta")
+    hist = disk_cache.get(source.cache_key, name + "_hist")
+    edges = disk_cache.get(source.cache_key, name + "_edges")
+    if meta is None or hist is None or edges is None:
+        return None
+    minimum, maximum, valid_count, invalid_count = (float(v) for v in meta)
+    return RasterStats(source.dtype, minimum, maximum, np.array(hist), np.array(edges),
+                       int(valid_count), int(invalid_count))
+
+
+def save_stats(source, stats):
+    name = entry_name("stats", source.selection.key)
+    meta = np.array([stats.minimum, stats.maximum, stats.valid_count, stats.invalid_count], dtype=np.float64)
+    disk_cache.put(source.cache_key, name + "_hist", stats.hist)
+    disk_cache.put(source.cache_key, name + "_edges", stats.edges)
+    # Written last, so a partially saved entry is never picked up.
+    disk_cache.put(source.cache_key, name + "_meta", meta)
+
+
+def cached_stats(source):
+    key = (source.cache_key, source.selection.key)
+    stats = stats_cache.get(key)
+    if stats is None:
+        stats = load_stats(source)
+        if stats is not None:
+            stats_cache.put(key, stats)
+    return stats
+
+
+def get_raster_stats(source, is_cancelled=None, progress=None):
+    stats = cached_stats(source)
+    if stats is None:
+        stats = compute_stats(source, is_cancelled=is_cancelled, progress=progress)
+        if stats is None:
+            return None
+        save_stats(source, stats)
+        stats_cache.put((source.cache_key, source.selection.key), stats)
+    return stats
@@ -0,0 +1,232 @@
+import os
+import json
+import queue
+import logging
+import hashlib
+import threading
+import numpy as np
+from core.disk_cache import default_cache_dir
+from utils.instrumentation import instrumentation
+
+log = logging.getLogger(__name__)
+
+
+def store_columns(store):
+    rows = np.flatnonzero(store.alive[:store.count])
+    coords = np.stack([store.x[rows], store.y[rows], store.w[rows], store.h[rows]], axis=1)
+    labels = [store.label_names[i] for i in store.label_id[rows].tolist()]
+    return coords, labels, store.class_id[rows].copy()
+
+
+def save_npz(pth, coords, labels, class_ids):
+    tmp = pth + ".tmp"
+    with open(tmp, "wb") as f:
+        np.savez(f, coords=coords, labels=np.array(labels, dtype=str), class_ids=class_ids)
+    os.replace(tmp, pth)
+
+
+def load_npz(pth):
+    with np.load(pth, allow_pickle=False) as data:
+        return data["coords"].reshape(-1, 4), data["labels"].tolist(), data["class_ids"]
+
+
+def save_json(pth, coords, labels, class_ids):
+    data = {}
+    for (x, y, w, h), label, class_id in zip(coords.tolist(), labels, class_ids.tolist()):
+        tag = {'coords': [x, y, w, h], 'label': label}
+        if class_id:
+            tag['class_id'] = class_id
+        data[f"{label}_{x}_{y}"] = tag
+    tmp = pth + ".tmp"
+    with open(tmp, "w") as f:
+        # Indented output goes through the pure Python encoder and is several times slower.
+        f.write(json.dumps(data))
+    os.replace(tmp, pth)
+
+
+def load_json(pth):
+    with open(pth, "r") as f:
+        data = json.load(f)
+    tags = list(data.values())
+    coords = np.array([tag['coords'] for tag in tags], dtype=np.float64).reshape(-1, 4)
+    labels = [tag['label'] for tag in tags]
+    class_ids = np.array([tag.get('class_id', 0) for tag in tags], dtype=np.int32)
+    return coords, labels, class_ids
+
+
+def load_tags_file(pth):
+    with instrumentation.span("tags.load"):
+        if pth.lower().endswith(".npz"):
+            return load_npz(pth)
+        return load_json(pth)
+
+
+def save_tags_file(pth, coords, labels, class_ids):
+    with instrumentation.span("tags.save", count=len(coords)):
+        if pth.lower().endswith(".npz"):
+            save_npz(pth, coords, labels, class_ids)
+        else:
+            save_json(pth, coords, labels, class_ids)
+
+
+def iter_chunks(coords, labels, class_ids, chunk_size=10000):
+    for start in range(0, len(coords), chunk_size):
+        stop = start + chunk_size
+        yield coords[start:stop], labels[start:stop], class_ids[start:stop]
+
+
+def sidecar_path(image_path):
+    # Next to the image where possible; images in read-only folders keep their tags in the cache.
+    if os.access(os.path.dirname(os.path.abspath(image_path)), os.W_OK):
+        return image_path + ".tags.npz"
+    digest = hashlib.sha1(os.path.abspath(image_path).encode("utf-8")).hexdigest()
+    return os.path.join(default_cache_dir(), "sidecars", digest + ".tags.npz")
+
+
+def find_sidecar(image_path):
+    for pth in (sidecar_path(image_path), image_path + ".tags.npz"):
+        if os.path.exists(pth):
+            return pth
+    return None
+
+
+def columns_nbytes(columns):
+    coords, labels, class_ids = columns
+    return coords.nbytes + class_ids.nbytes + 64 * len(labels)
+
+
+def journal_path(image_path):
+    digest = hashlib.sha1(os.path.abspath(image_path).encode("utf-8")).hexdigest()
+    return os.path.join(default_cache_dir(), "journal", digest + ".jsonl")
+
+
+def read_journal(pth):
+    records = []
+    try:
+        with open(pth, "r") as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    # A crash can leave the last line half written.
+                    break
+    except OSError:
+        pass
+    return records
+
+
+def journal_has_edits(records):
+    return any(record.get('op') != 'base' for record in records)
+
+
+class TagJournal:
+    # Append-only log of tag edits, written on a background thread.
+    # The file only exists while there are edits that no saved file holds.
+    def __init__(self, on_error=None):
+        self.path = None
+        self.fresh = False
+        self.on_error = on_error  # called from the journal thread with (path, message)
+        self.base_line = None
+        self.queue = queue.Queue()
+        # {path: queued commands that write or remove it}, so a reader can wait for one file only.
+        self.pending = {}
+        self.condition = threading.Condition()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def open(self, pth):
+        self.path = pth
+        self.fresh = False
+
+    def record(self, op, **fields):
+        if self.path is None:
+            return
+        if self.fresh:
+            self.put("reset", self.path, self.base_line)
+            self.fresh = False
+        self.put("write", self.path, json.dumps(dict(op=op, **fields)))
+
+    def start_from(self, base):
+        # The next edit truncates the journal and records what it applies to.
+        self.base_line = json.dumps({'op': 'base', 'path': base}) if base else None
+        self.fresh = True
+
+    def reset(self, base=None):
+        if self.path is not None:
+            self.put("discard", self.path, None)
+            self.start_from(base)
+
+    def save_sidecar(self, sidecar, columns):
+        # Written on the journal thread so the journal is only dropped once the sidecar is on disk.
+        if self.path is not None:
+            self.put("sidecar", self.path, (sidecar, columns))
+            self.start_from(sidecar)
+
+    def discard(self):
+        if self.path is not None:
+            self.put("discard", self.path, None)
+
+    def close(self):
+        if self.path is not None:
+            self.put("close", self.path, None)
+            self.path = None
+
+    def flush(self):
+        self.queue.join()
+
+    def wait_for(self, *paths):
+        # Unlike flush, returns as soon as these files are written, whatever else is still queued.
+        with self.condition:
+            self.condition.wait_for(lambda: not any(pth in self.pending for pth in paths))
+
+    def paths_of(self, command, pth, payload):
+        return (pth, payload[0]) if command == "sidecar" else (pth,)
+
+    def put(self, command, pth, payload):
+        with self.condition:
+            for touched in self.paths_of(command, pth, payload):
+                self.pending[touched] = self.pending.get(touched, 0) + 1
+        self.queue.put((command, pth, payload))
+
+    def run(self):
+        f = None
+        f_path = None
+        while True:
+            command, pth, payload = self.queue.get()
+            try:
+                if f is not None and (f_path != pth or command != "write"):
+                    f.close()
+                    f = None
+                if command == "sidecar":
+                    sidecar, columns = payload
+                    if len(columns[0]):
+                        os.makedirs(os.path.dirname(sidecar), exist_ok=True)
+                        with instrumentation.span("tags.sidecar", count=len(columns[0])):
+                            save_npz(sidecar, *columns)
+                    elif os.path.exists(sidecar):
+                        os.remove(sidecar)
+                if command in ("discard", "sidecar"):
+                    if os.path.exists(pth):
+                        os.remove(pth)
+                elif command in ("write", "reset"):
+                    if f is None:
+                        os.makedirs(os.path.dirname(pth), exist_ok=True)
+                        f = open(pth, "w" if command == "reset" else "a")
+                        f_path = pth
+                    if payload is not None:
+                        f.write(payload + "\n")
+                if f is not None and self.queue.empty():
+                    f.flush()
+                    os.fsync(f.fileno())
+            except (OSError, ValueError) as e:
+                log.warning("Tag journal write failed for %s: %s", pth, e)
+                if self.on_error is not None:
+                    self.on_error(payload[0] if command == "sidecar" else pth, str(e))
+            finally:
+                with self.condition:
+                    for touched in self.paths_of(command, pth, payload):
+                        self.pending[touched] -= 1
+                        if not self.pending[touched]:
+                            del self.pending[touched]
+                    self.condition.notify_all()
+                self.queue.task_done()
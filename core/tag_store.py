@@ -0,0 +1,247 @@
+import math
+import numpy as np
+
+
+def tag_bounds(coords):
+    # Tags drawn up or to the left have negative width/height.
+    x, y, w, h = coords
+    return min(x, x + w), min(y, y + h), max(x, x + w), max(y, y + h)
+
+
+class TagStore:
+    def __init__(self, cell_size=256, capacity=1024, max_query_cells=64):
+        self.cell_size = cell_size
+        self.max_query_cells = max_query_cells
+        self.grid = {}  # {(cx, cy): set(rows)}
+        self.row_of = {}  # {id: row}
+        self.label_names = []
+        self.label_ids = {}  # {label: label id}
+        self.labels = {}  # {label: set(ids)}
+        self.version = 0  # bumped whenever rows are added, removed or renumbered
+        self.show_new = True  # visibility given to rows added from now on
+        self.allocate(capacity)
+        self.clear()
+
+    def allocate(self, capacity):
+        self.ids = np.zeros(capacity, dtype=np.int64)
+        self.x = np.zeros(capacity, dtype=np.float64)
+        self.y = np.zeros(capacity, dtype=np.float64)
+        self.w = np.zeros(capacity, dtype=np.float64)
+        self.h = np.zeros(capacity, dtype=np.float64)
+        self.label_id = np.zeros(capacity, dtype=np.int32)
+        self.class_id = np.zeros(capacity, dtype=np.int32)
+        self.alive = np.zeros(capacity, dtype=bool)
+        self.visible = np.zeros(capacity, dtype=bool)
+
+    def grow(self, capacity):
+        columns = ("ids", "x", "y", "w", "h", "label_id", "class_id", "alive", "visible")
+        old = {name: getattr(self, name) for name in columns}
+        self.allocate(capacity)
+        for name, values in old.items():
+            getattr(self, name)[:len(values)] = values
+
+    def __len__(self):
+        return len(self.row_of)
+
+    def __contains__(self, tag_id):
+        return tag_id in self.row_of
+
+    def __iter__(self):
+        for tag_id in list(self.row_of):
+            yield tag_id, self.get(tag_id)
+
+    def get(self, tag_id):
+        row = self.row_of.get(tag_id)
+        return None if row is None else self.get_row(row)
+
+    def intern_label(self, label):
+        label_id = self.label_ids.get(label)
+        if label_id is None:
+            label_id = len(self.label_names)
+            self.label_names.append(label)
+            self.label_ids[label] = label_id
+        return label_id
+
+    def cell_range(self, x0, y0, x1, y1):
+        size = self.cell_size
+        return (int(math.floor(x0 / size)), int(math.floor(y0 / size)),
+                int(math.floor(x1 / size)), int(math.floor(y1 / size)))
+
+    def cells(self, x0, y0, x1, y1):
+        c0, r0, c1, r1 = self.cell_range(x0, y0, x1, y1)
+        return [(cx, cy) for cy in range(r0, r1 + 1) for cx in range(c0, c1 + 1)]
+
+    def row_bounds(self, row):
+        return tag_bounds((self.x[row], self.y[row], self.w[row], self.h[row]))
+
+    def index(self, row):
+        for cell in self.cells(*self.row_bounds(row)):
+            self.grid.setdefault(cell, set()).add(row)
+
+    def index_many(self, rows):
+        bx, by, bw, bh = self.columns(rows)
+        size = self.cell_size
+        c0, r0 = np.floor(bx / size).astype(np.int64), np.floor(by / size).astype(np.int64)
+        c1, r1 = np.floor((bx + bw) / size).astype(np.int64), np.floor((by + bh) / size).astype(np.int64)
+        grid = self.grid
+        for row, a, b, c, d in zip(rows.tolist(), c0.tolist(), r0.tolist(), c1.tolist(), r1.tolist()):
+            for cy in range(b, d + 1):
+                for cx in range(a, c + 1):
+                    grid.setdefault((cx, cy), set()).add(row)
+
+    def unindex(self, row):
+        for cell in self.cells(*self.row_bounds(row)):
+            rows = self.grid.get(cell)
+            if rows is not None:
+                rows.discard(row)
+                if not rows:
+                    del self.grid[cell]
+
+    def add(self, coords, label=None, tag_id=None, class_id=0):
+        if tag_id is None:
+            tag_id = self.next_id
+        self.next_id = max(self.next_id, tag_id + 1)
+        if label is None:
+            label = f"Tag-{tag_id}"
+        if tag_id in self.row_of:
+            self.remove(tag_id)
+        if self.count == len(self.ids):
+            self.grow(2 * len(self.ids))
+        row = self.count
+        self.count += 1
+        self.ids[row] = tag_id
+        self.x[row], self.y[row], self.w[row], self.h[row] = coords
+        self.label_id[row] = self.intern_label(label)
+        self.class_id[row] = class_id
+        self.alive[row] = True
+        self.visible[row] = self.show_new
+        self.row_of[tag_id] = row
+        self.labels.setdefault(label, set()).add(tag_id)
+        self.index(row)
+        self.version += 1
+        return tag_id
+
+    def add_many(self, coords, labels, class_ids=None):
+        # Bulk insert for loaders; coords is an (n, 4) array of x, y, w, h.
+        coords = np.asarray(coords, dtype=np.float64).reshape(-1, 4)
+        n = len(coords)
+        if self.count + n > len(self.ids):
+            self.grow(max(2 * len(self.ids), self.count + n))
+        rows = np.arange(self.count, self.count + n)
+        ids = np.arange(self.next_id, self.next_id + n, dtype=np.int64)
+        self.ids[rows] = ids
+        self.x[rows], self.y[rows], self.w[rows], self.h[rows] = coords.T
+        self.label_id[rows] = [self.intern_label(label) for label in labels]
+        self.class_id[rows] = 0 if class_ids is None else class_ids
+        self.alive[rows] = True
+        self.visible[rows] = self.show_new
+        self.count += n
+        self.next_id += n
+        for row, tag_id, label in zip(rows.tolist(), ids.tolist(), labels):
+            self.row_of[tag_id] = row
+            self.labels.setdefault(label, set()).add(tag_id)
+        self.index_many(rows)
+        self.version += 1
+        return ids
+
+    def remove(self, tag_id):
+        row = self.row_of.pop(tag_id, None)
+        if row is None:
+            return None
+        tag = self.get_row(row)
+        self.unindex(row)
+        self.alive[row] = False
+        self.visible[row] = False
+        self.version += 1
+        ids = self.labels.get(tag['label'])
+        if ids is not None:
+            ids.discard(tag_id)
+            if not ids:
+                del self.labels[tag['label']]
+        if self.count > 1024 and len(self.row_of) < self.count // 2:
+            self.compact()
+        return tag
+
+    def get_row(self, row):
+        return {
+            'coords': (float(self.x[row]), float(self.y[row]), float(self.w[row]), float(self.h[row])),
+            'label': self.label_names[self.label_id[row]],
+            'class_id': int(self.class_id[row]),
+        }
+
+    def compact(self):
+        keep = np.flatnonzero(self.alive[:self.count])
+        for name in ("ids", "x", "y", "w", "h", "label_id", "class_id", "alive", "visible"):
+            column = getattr(self, name)
+            column[:len(keep)] = column[keep]
+        self.alive[len(keep):] = False
+        self.visible[len(keep):] = False
+        self.count = len(keep)
+        self.row_of = {int(tag_id): row for row, tag_id in enumerate(self.ids[:self.count].tolist())}
+        self.grid.clear()
+        for row in range(self.count):
+            self.index(row)
+        self.version += 1
+
+    def update(self, tag_id, coords):
+        row = self.row_of[tag_id]
+        self.unindex(row)
+        self.x[row], self.y[row], self.w[row], self.h[row] = coords
+        self.index(row)
+
+    def with_label(self, label):
+        return self.labels.get(label, set())
+
+    def columns(self, rows):
+        x, y, w, h = self.x[rows], self.y[rows], self.w[rows], self.h[rows]
+        return np.minimum(x, x + w), np.minimum(y, y + h), np.abs(w), np.abs(h)
+
+    def query_rows(self, x0, y0, x1, y1):
+        c0, r0, c1, r1 = self.cell_range(x0, y0, x1, y1)
+        if (c1 - c0 + 1) * (r1 - r0 + 1) > self.max_query_cells:
+            # Large viewports: a vectorised scan beats walking the grid.
+            rows = np.flatnonzero(self.alive[:self.count])
+        else:
+            buckets = [self.grid[cell] for cell in self.cells(x0, y0, x1, y1) if cell in self.grid]
+            if not buckets:
+                return np.zeros(0, dtype=np.intp)
+            rows = np.fromiter(set().union(*buckets), dtype=np.intp)
+        bx, by, bw, bh = self.columns(rows)
+        mask = (bx <= x1) & (bx + bw >= x0) & (by <= y1) & (by + bh >= y0)
+        return rows[mask]
+
+    def query(self, x0, y0, x1, y1):
+        return set(self.ids[self.query_rows(x0, y0, x1, y1)].tolist())
+
+    def set_visible(self, visible, tag_ids=None):
+        if tag_ids is None:
+            self.show_new = visible
+            self.visible[:self.count] = self.alive[:self.count] & visible
+        else:
+            rows = [self.row_of[tag_id] for tag_id in tag_ids if tag_id in self.row_of]
+            self.visible[rows] = visible
+
+    def hit_test(self, x, y):
+        # The most recently added tag wins when boxes overlap; hidden tags cannot be picked.
+        rows = self.query_rows(x, y, x, y)
+        rows = rows[self.visible[rows]]
+        return int(self.ids[rows.max()]) if len(rows) else None
+
+    def extent(self):
+        rows = np.flatnonzero(self.alive[:self.count])
+        if not len(rows):
+            return None
+        bx, by, bw, bh = self.columns(rows)
+        return float(bx.min()), float(by.min()), float((bx + bw).max()), float((by + bh).max())
+
+    def clear(self):
+        self.grid.clear()
+        self.row_of.clear()
+        self.label_names.clear()
+        self.label_ids.clear()
+        self.labels.clear()
+        self.alive[:] = False
+        self.visible[:] = False
+        self.count = 0
+        self.next_id = 1
+        self.version += 1
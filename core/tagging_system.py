@@ -1,6 +1,17 @@
-from PyQt6.QtWidgets import QListWidget, QDockWidget, QWidget, QVBoxLayout, QToolBar, QLabel, QGraphicsView, QGraphicsRectItem, QFileDialog, QMessageBox
+import os
+import numpy as np
+from PyQt6.QtWidgets import QListWidget, QListWidgetItem, QDockWidget, QWidget, QVBoxLayout, QToolBar, QLabel, QGraphicsView, QGraphicsItem, QGraphicsRectItem, QFileDialog, QMessageBox
 from PyQt6.QtGui import QIcon, QFont, QAction,QPen,QColor
-from PyQt6.QtCore import Qt, QSizeF, QRectF, QPoint, QPointF,QSize
+from PyQt6.QtCore import Qt, QSizeF, QRectF, QPoint, QPointF,QSize, QObject, QRunnable, QThreadPool, QTimer, pyqtSignal
+from core.tag_store import TagStore
+from core.tag_io import (TagJournal, journal_path, read_journal, journal_has_edits,
+                         load_tags_file, save_tags_file, store_columns, iter_chunks,
+                         sidecar_path, find_sidecar, columns_nbytes)
+from utils.lru_cache import LRUCache
+from utils.instrumentation import instrumentation
+
+
+CLASS_COLORS = [QColor(255, 0, 0), QColor(0, 160, 255), QColor(255, 200, 0), QColor(0, 200, 0), QColor(200, 0, 255)]
 
 
 class ResizeRect(QGraphicsRectItem):
@@ -25,6 +36,8 @@ class ResizeRect(QGraphicsRectItem):
         self.original_pos = QPointF()
         self.original_mouse_pos = QPointF()
         self.is_moving = False
+        self.tag_id = None
+        self.changed = None
         
         self.cursor_shapes = {
             'top_left': Qt.CursorShape.SizeFDiagCursor,
@@ -172,8 +185,11 @@ class ResizeRect(QGraphicsRectItem):
     
     def mouseReleaseEvent(self, event):
         if event.button() == Qt.MouseButton.LeftButton:
+            edited = self.active_resize_handle is not None or self.is_moving
             self.active_resize_handle = None
             self.is_moving = False
+            if edited and self.changed is not None:
+                self.changed(self)
             event.accept()
         else:
             super().mouseReleaseEvent(event)
@@ -186,10 +202,105 @@ class ResizeRect(QGraphicsRectItem):
         self.setSelected(False)
         super().focusOutEvent(event)
 
+class TagBatchItem(QGraphicsItem):
+    def __init__(self, store, thin_threshold=2000):
+        super().__init__()
+        self.store = store
+        self.hidden_id = None
+        self.rect = QRectF()
+        self.rects = {}  # {row: QRectF}, reset whenever store rows change
+        self.rects_version = None
+        self.thin_threshold = thin_threshold
+        self.pens = []
+        self.thin_pens = []
+        for color in CLASS_COLORS:
+            pen = QPen(color, 2)
+            pen.setCosmetic(True)
+            self.pens.append(pen)
+            # Wide pens are several times slower to stroke; dense views use hairlines.
+            thin_pen = QPen(color, 0)
+            thin_pen.setCosmetic(True)
+            self.thin_pens.append(thin_pen)
+        self.setFlag(QGraphicsItem.GraphicsItemFlag.ItemUsesExtendedStyleOption, True)
+        self.setZValue(1)
+
+    def boundingRect(self):
+        return self.rect
+
+    def refresh(self, tag_id=None):
+        if tag_id in self.store:
+            self.rects.pop(self.store.row_of[tag_id], None)
+        extent = self.store.extent()
+        rect = QRectF() if extent is None else QRectF(QPointF(extent[0], extent[1]), QPointF(extent[2], extent[3]))
+        if rect != self.rect:
+            self.prepareGeometryChange()
+            self.rect = rect
+        self.update()
+
+    def paint(self, painter, option, widget=None):
+        exposed = option.exposedRect
+        rows = self.store.query_rows(exposed.left(), exposed.top(), exposed.right(), exposed.bottom())
+        if self.hidden_id in self.store:
+            # The tag being edited is drawn by its own ResizeRect.
+            rows = rows[rows != self.store.row_of[self.hidden_id]]
+        if not len(rows):
+            return
+        if self.rects_version != self.store.version:
+            self.rects.clear()
+            self.rects_version = self.store.version
+        missing = [row for row in rows.tolist() if row not in self.rects]
+        if missing:
+            x, y, w, h = (column.tolist() for column in self.store.columns(missing))
+            for i, row in enumerate(missing):
+                self.rects[row] = QRectF(x[i], y[i], w[i], h[i])
+        pens = self.thin_pens if len(rows) > self.thin_threshold else self.pens
+        classes = self.store.class_id[rows] % len(pens)
+        painter.setBrush(Qt.BrushStyle.NoBrush)
+        for class_id in np.unique(classes).tolist():
+            painter.setPen(pens[class_id])
+            painter.drawRects([self.rects[row] for row in rows[classes == class_id].tolist()])
+
+
+class TagLoadSignals(QObject):
+    loaded = pyqtSignal(object, object)
+    failed = pyqtSignal(object, str)
+
+
+class TagJournalSignals(QObject):
+    failed = pyqtSignal(str, str)
+
+
+class TagLoadTask(QRunnable):
+    # Parses a tag file off the GUI thread; the handler then fills the store in chunks.
+    def __init__(self, pth, signals, image_path=None):
+        super().__init__()
+        self.setAutoDelete(False)
+        self.path = pth
+        self.image_path = image_path  # set for sidecars read ahead for a neighbouring image
+        self.signals = signals
+        self.cancelled = False
+        self.count = 0
+        self.chunks = None
+
+    def run(self):
+        try:
+            columns = load_tags_file(self.path)
+        except Exception as e:
+            if not self.cancelled:
+                self.signals.failed.emit(self, str(e))
+            return
+        if not self.cancelled:
+            self.signals.loaded.emit(self, columns)
+
+
 class TagHandler:
     def __init__(self, main_window):
         self.main_window = main_window
-        self.tags = {}  # {id: {'rect': patch, 'coords': (x,y,w,h), 'label': str}}
+        self.store = TagStore()
+        self.batch_item = TagBatchItem(self.store)
+        self.edit_item = None  # ResizeRect for the tag being edited
+        self.list_items = {}  # {id: QListWidgetItem}
+        self.selected_id = None
         self.tag_layer= None
         self.tag_list = None
         self.tag_dock = None
@@ -198,12 +309,77 @@ class TagHandler:
         self.current_rect = None
         self.start_pos = None
         self.tag_scene = None
+        self.journal_signals = TagJournalSignals()
+        self.journal_signals.failed.connect(self.on_journal_failed)
+        self.journal = TagJournal(on_error=self.journal_signals.failed.emit)
+        self.load_pool = QThreadPool()
+        self.load_pool.setMaxThreadCount(2)
+        self.load_signals = TagLoadSignals()
+        self.load_signals.loaded.connect(self.on_tags_parsed)
+        self.load_signals.failed.connect(self.on_load_failed)
+        self.load_task = None
+        self.image_path = None
+        self.sidecar_dirty = False  # tags differ from the current image's sidecar
+        self.sidecar_cache = LRUCache(64 * 1024 * 1024, sizeof=columns_nbytes)  # {image path: columns}
+        self.sidecar_tasks = {}  # {image path: TagLoadTask}
+        # One chunk per event loop pass keeps the GUI responsive while large sets load.
+        self.load_timer = QTimer()
+        self.load_timer.setInterval(0)
+        self.load_timer.timeout.connect(self.load_next_chunk)
         
         self.init_tag_layer()
         
     def init_tag_layer(self):
         self.create_tag_dock()
         self.conntect_events()
+    
+    def attach_batch_item(self):
+        if self.batch_item.scene() is None:
+            self.main_window.scene.addItem(self.batch_item)
+        self.batch_item.refresh()
+    
+    def detach_batch_item(self):
+        if self.batch_item.scene() is not None:
+            self.batch_item.scene().removeItem(self.batch_item)
+    
+    def begin_edit(self, tag_id):
+        self.end_edit()
+        x, y, w, h = self.store.get(tag_id)['coords']
+        rect_item = ResizeRect(0, 0, w, h)
+        rect_item.setPos(x, y)
+        rect_item.setPen(QPen(QColor(255, 0, 0), 2))
+        rect_item.setZValue(2)
+        rect_item.setVisible(self.batch_item.isVisible())
+        rect_item.tag_id = tag_id
+        rect_item.changed = self.on_rect_changed
+        self.main_window.scene.addItem(rect_item)
+        self.edit_item = rect_item
+        self.batch_item.hidden_id = tag_id
+        self.batch_item.update()
+        return rect_item
+    
+    def end_edit(self):
+        if self.edit_item is not None:
+            if self.edit_item.scene() is not None:
+                self.edit_item.scene().removeItem(self.edit_item)
+            self.edit_item = None
+        self.batch_item.hidden_id = None
+        self.batch_item.update()
+    
+    def on_rect_changed(self, rect_item):
+        rect = rect_item.rect()
+        pos = rect_item.pos()
+        self.store.update(rect_item.tag_id, (pos.x() + rect.x(), pos.y() + rect.y(), rect.width(), rect.height()))
+        self.batch_item.refresh(rect_item.tag_id)
+        self.journal.record("update", id=rect_item.tag_id, coords=list(self.store.get(rect_item.tag_id)['coords']))
+        self.is_dirty = True
+        self.sidecar_dirty = True
+    
+    def add_list_item(self, tag_id, label):
+        list_item = QListWidgetItem(label)
+        list_item.setData(Qt.ItemDataRole.UserRole, tag_id)
+        self.tag_list.addItem(list_item)
+        self.list_items[tag_id] = list_item
         
     def create_tag_dock(self):
         self.tag_dock = QDockWidget("Tag Control", self.main_window)
@@ -216,6 +392,7 @@ class TagHandler:
         self.tag_list.setSelectionMode(QListWidget.SelectionMode.SingleSelection)
         self.tag_list.itemSelectionChanged.connect(self.handle_tag_selection)
         self.tag_list.setFont(QFont('Arial', 10))
+        self.tag_list.setUniformItemSizes(True)
         
         toolbar = QToolBar()
         toolbar.setIconSize(QSize(16, 16))
@@ -278,6 +455,14 @@ class TagHandler:
             self.main_window.scene.addItem(self.current_rect)
             
         else:
+            if event.button() == Qt.MouseButton.LeftButton:
+                pos = self.main_window.graphics_view.mapToScene(event.pos())
+                tag_id = self.store.hit_test(pos.x(), pos.y())
+                if tag_id is not None and tag_id != self.selected_id:
+                    self.tag_list.blockSignals(True)
+                    self.tag_list.setCurrentItem(self.list_items[tag_id])
+                    self.tag_list.blockSignals(False)
+                    self.select_tag(tag_id)
             QGraphicsView.mousePressEvent(self.main_window.graphics_view, event)
     
     def mouse_move_event(self, event):
@@ -298,16 +483,15 @@ class TagHandler:
             
             self.current_rect.setRect(0,0,width, height)
             
-            tag_id = len(self.tags) + 1
-            self.tags[tag_id] = {
-                'rect': self.current_rect,
-                'coords': (self.start_pos.x(), self.start_pos.y(), width, height),
-                'label': f"Tag-{tag_id}"
-            }
-            
-            self.tag_list.addItem(f"Tag-{tag_id}")
+            tag_id = self.store.add((self.start_pos.x(), self.start_pos.y(), width, height))
+            self.main_window.scene.removeItem(self.current_rect)
+            tag = self.store.get(tag_id)
+            self.add_list_item(tag_id, tag['label'])
+            self.journal.record("add", id=tag_id, coords=list(tag['coords']), label=tag['label'], class_id=tag['class_id'])
+            self.attach_batch_item()
             
             self.is_dirty = True
+            self.sidecar_dirty = True
             self.start_pos = None
             self.current_rect = None
             self.drawing = False
@@ -321,45 +505,168 @@ class TagHandler:
             self.main_window,
             "Load Tags",
             "",
-            "JSON Files(*.json);;All Files (*)",
+            "Tag Files (*.json *.npz);;JSON Files(*.json);;Binary Tag Files (*.npz);;All Files (*)",
             options=options
         )
         if file_path:
-            try:
-                with open(file_path, "r") as f:
-                    import json
-                    data = json.load(f)
-                
-                self.clear_tags()
-                
-                for tag_key, tag_data in data.items():
-                    x, y, w, h = tag_data['coords']
-                    label = tag_data['label']
-                    
-                    rect_item = ResizeRect(0, 0, w, h)  
-                    rect_item.setPos(x, y)
-                    rect_item.setPen(QPen(QColor(255, 0, 0), 2))
-                    self.main_window.scene.addItem(rect_item)
-                    
-                    tag_id = hash(tag_key)
-                    
-                    self.tags[tag_id] = {
-                        'rect': rect_item,
-                        'coords': (x, y, w, h),
-                        'label': label
-                    }
-                    self.tag_list.addItem(label) 
-                
-                self.main_window.statusBar.showMessage(f"Loaded {len(data)} tags from {file_path}", 3000)
-                self.is_dirty = False
-            except Exception as e:
-                QMessageBox.critical(self.main_window, "Error", f"Failed to load tags: {str(e)}")
+            self.clear_tags()
+            self.start_load(file_path)
+            self.main_window.statusBar.showMessage(f"Loading tags from {file_path}...")
+    
+    def start_load(self, pth, columns=None):
+        self.cancel_load()
+        self.load_task = TagLoadTask(pth, self.load_signals)
+        if columns is None:
+            self.load_pool.start(self.load_task)
+        else:
+            self.on_tags_parsed(self.load_task, columns)
+    
+    def cancel_load(self):
+        self.load_timer.stop()
+        if self.load_task is not None:
+            self.load_task.cancelled = True
+            self.load_pool.tryTake(self.load_task)
+            self.load_task = None
+    
+    def on_tags_parsed(self, task, columns):
+        if task.image_path is not None:
+            if self.sidecar_tasks.get(task.image_path) is task:
+                del self.sidecar_tasks[task.image_path]
+                if task.image_path not in self.sidecar_cache:
+                    self.sidecar_cache.put(task.image_path, columns)
+            return
+        if task is not self.load_task:
+            return
+        task.count = len(columns[0])
+        task.chunks = iter_chunks(*columns, chunk_size=5000)
+        self.load_timer.start()
+    
+    def load_next_chunk(self):
+        task = self.load_task
+        chunk = next(task.chunks, None) if task is not None else None
+        if chunk is None:
+            self.load_timer.stop()
+            if task is not None:
+                self.finish_load(task)
+            return
+        coords, labels, class_ids = chunk
+        with instrumentation.span("tags.fill", count=len(coords)):
+            ids = self.store.add_many(coords, labels, class_ids)
+            self.tag_list.setUpdatesEnabled(False)
+            for tag_id, label in zip(ids.tolist(), labels):
+                self.add_list_item(tag_id, label)
+            self.tag_list.setUpdatesEnabled(True)
+    
+    def finish_load(self, task):
+        self.load_task = None
+        # Drawing once at the end avoids repainting the whole set after every chunk.
+        self.attach_batch_item()
+        self.journal.reset(base=task.path)
+        self.main_window.statusBar.showMessage(f"Loaded {task.count} tags from {task.path}", 3000)
+        self.is_dirty = False
+        self.sidecar_dirty = self.image_path is not None and task.path != sidecar_path(self.image_path)
+    
+    def on_load_failed(self, task, message):
+        if task.image_path is not None:
+            if self.sidecar_tasks.get(task.image_path) is task:
+                del self.sidecar_tasks[task.image_path]
+            return
+        if task is not self.load_task:
+            return
+        self.load_task = None
+        QMessageBox.critical(self.main_window, "Error", f"Failed to load tags: {message}")
+    
+    def on_journal_failed(self, pth, message):
+        self.main_window.statusBar.showMessage(f"Could not save tags to {pth}: {message}", 10000)
+    
+    def enter_image(self, image_path):
+        # Edits are journaled per image; leftovers mean the last session ended unsaved.
+        self.image_path = image_path
+        pth = journal_path(image_path)
+        self.journal.open(pth)
+        # Only this image's journal and sidecar need to be on disk; other images' writes carry on.
+        self.journal.wait_for(pth, sidecar_path(image_path))
+        records = read_journal(pth)
+        if journal_has_edits(records):
+            edits = sum(1 for record in records if record.get('op') != 'base')
+            reply = QMessageBox.question(self.main_window, "Recover Tags",
+                                         f"Found {edits} unsaved tag edits for {os.path.basename(image_path)}. Recover them?",
+                                         QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
+            if reply == QMessageBox.StandardButton.Yes:
+                self.replay_journal(records)
+                return
+        self.journal.reset()
+        columns = self.sidecar_cache.get(image_path)
+        sidecar = sidecar_path(image_path) if columns is not None else find_sidecar(image_path)
+        if sidecar is not None:
+            self.start_load(sidecar, columns)
+    
+    def store_sidecar(self):
+        # A partially loaded store must not overwrite the sidecar.
+        if self.image_path is None or not self.sidecar_dirty or self.load_task is not None:
+            return
+        columns = store_columns(self.store)
+        self.sidecar_cache.put(self.image_path, columns)
+        self.journal.save_sidecar(sidecar_path(self.image_path), columns)
+        self.sidecar_dirty = False
+        self.is_dirty = False
+    
+    def cancel_rect(self):
+        # A rectangle still being dragged out; the scene is about to be cleared under it.
+        if self.current_rect is not None:
+            if self.current_rect.scene() is not None:
+                self.current_rect.scene().removeItem(self.current_rect)
+            self.current_rect = None
+        self.start_pos = None
+    
+    def leave_image(self):
+        self.cancel_rect()
+        self.store_sidecar()
+        self.clear_tags()
+        self.journal.close()
+        self.image_path = None
+    
+    def prefetch_sidecars(self, image_paths):
+        for image_path in image_paths:
+            if image_path in self.sidecar_cache or image_path in self.sidecar_tasks:
+                continue
+            pth = find_sidecar(image_path)
+            if pth is None:
+                continue
+            task = TagLoadTask(pth, self.load_signals, image_path)
+            self.sidecar_tasks[image_path] = task
+            self.load_pool.start(task)
+    
+    def replay_journal(self, records):
+        try:
+            for record in records:
+                op = record.get('op')
+                if op == 'base':
+                    self.store.clear()
+                    if os.path.exists(record['path']):
+                        self.store.add_many(*load_tags_file(record['path']))
+                elif op == 'add':
+                    self.store.add(tuple(record['coords']), record['label'], record['id'], record.get('class_id', 0))
+                elif op == 'update' and record['id'] in self.store:
+                    self.store.update(record['id'], tuple(record['coords']))
+                elif op == 'remove':
+                    self.store.remove(record['id'])
+        except Exception as e:
+            print(f"Tag recovery failed: {e}")
+        self.tag_list.setUpdatesEnabled(False)
+        for tag_id, row in sorted(self.store.row_of.items(), key=lambda item: item[1]):
+            self.add_list_item(tag_id, self.store.label_names[self.store.label_id[row]])
+        self.tag_list.setUpdatesEnabled(True)
+        self.attach_batch_item()
+        self.is_dirty = True
+        self.sidecar_dirty = True
+        self.main_window.statusBar.showMessage(f"Recovered {len(self.store)} tags", 3000)
     
     def check_if_dirty(self):
         return self.is_dirty
     
     def save_tags(self):
-        if not self.tags:
+        if not len(self.store):
             QMessageBox.warning(self.main_window, "Warning", "No tags to save")
             return
         options = QFileDialog.Option.ReadOnly
@@ -367,29 +674,19 @@ class TagHandler:
             self.main_window,
             "Save Tags",
             "",
-            "JSON Files (*.json);;All Files (*)",
+            "JSON Files (*.json);;Binary Tag Files (*.npz);;All Files (*)",
             options=options
         )
         if file_pth:
             try:
-                if not file_pth.lower().endswith('.json'):
+                if not file_pth.lower().endswith(('.json', '.npz')):
                     file_pth += '.json'
-                    
-                data = {}
-                for tag_id, tag_info in self.tags.items():
-                    serializable_tag = {
-                        'coords': tag_info['coords'],
-                        'label': tag_info['label']
-                    }
-                    key = f"{tag_info['label']}_{tag_info['coords'][0]}_{tag_info['coords'][1]}"
-                    data[key] = serializable_tag
-
-                with open(file_pth, "w") as f:
-                    import json
-                    json.dump(data, f, indent=2)
-                    self.main_window.statusBar.showMessage(f"Saved {len(data)} tags to {file_pth}", 3000)
+                
+                coords, labels, class_ids = store_columns(self.store)
+                save_tags_file(file_pth, coords, labels, class_ids)
+                self.journal.reset(base=file_pth)
+                self.main_window.statusBar.showMessage(f"Saved {len(coords)} tags to {file_pth}", 3000)
                 self.is_dirty = False
-                self.clear_tag_layer()
             except Exception as e:
                 QMessageBox.critical(self.main_window, "Error", f"Failed to save tags: {str(e)}")
                 
@@ -402,23 +699,27 @@ class TagHandler:
         
         selected_item = selected_items[0]
         tag_text = selected_item.text()
+        tag_id = selected_item.data(Qt.ItemDataRole.UserRole)
         
-        tag_to_remove = None
-        for tag_id, tag_info in self.tags.items():
-            if tag_info['label'] == tag_text:
-                tag_to_remove = tag_id
-                break
-        
-        if tag_to_remove is not None:
-            self.main_window.scene.removeItem(self.tags[tag_to_remove]['rect'])
-            del self.tags[tag_to_remove]
+        if tag_id in self.store:
+            if self.selected_id == tag_id:
+                self.selected_id = None
+                self.end_edit()
+            self.store.remove(tag_id)
+            self.journal.record("remove", id=tag_id)
+            self.sidecar_dirty = True
+            self.batch_item.refresh()
+            del self.list_items[tag_id]
             self.tag_list.takeItem(self.tag_list.row(selected_item))
             self.main_window.statusBar.showMessage(f"Deleted tag: {tag_text}", 2000)
 
     def clear_tags(self):
-        for tag_id, tag_info in self.tags.items():
-            self.main_window.scene.removeItem(tag_info['rect'])
-        self.tags.clear()
+        self.cancel_load()
+        self.end_edit()
+        self.detach_batch_item()
+        self.store.clear()
+        self.list_items.clear()
+        self.selected_id = None
         self.tag_list.clear()
         self.main_window.statusBar.showMessage("All tags cleared", 2000)
     
@@ -439,20 +740,22 @@ class TagHandler:
             self.main_window.graphics_view.viewport().setCursor(Qt.CursorShape.ArrowCursor)
             self.main_window.statusBar.showMessage("Drawing mode disabled", 2000)
             self.drawing = False
-            if self.current_rect:
-                self.main_window.scene.removeItem(self.current_rect)
-                self.current_rect = None
-            self.start_pos = None
+            self.cancel_rect()
 
     def set_tags_visible(self, visible):
-        for tag_id, tag_info in self.tags.items():
-            tag_info['rect'].setVisible(visible)
+        self.store.set_visible(visible)
+        self.batch_item.setVisible(visible)
+        if self.edit_item is not None:
+            self.edit_item.setVisible(visible)
         if visible:
             self.main_window.statusBar.showMessage("Tags are now visible", 2000)
         else:
             self.main_window.statusBar.showMessage("Tags are now hidden", 2000)
 
     def start_drawing(self):
+        if self.load_task is not None:
+            self.main_window.statusBar.showMessage("Tags are still loading", 2000)
+            return
         self.main_window.graphics_view.viewport().setCursor(Qt.CursorShape.CrossCursor)
         if self.tag_layer is None:
             self.main_window.vector_list.addItem("Tag Layer")
@@ -462,27 +765,27 @@ class TagHandler:
     
     def handle_tag_selection(self):
         selected_items = self.tag_list.selectedItems()
-        if not selected_items:
-            # Deselect all tags when nothing is selected
-            for tag_id, tag_info in self.tags.items():
-                tag_info['rect'].setSelected(False)
+        tag_id = selected_items[0].data(Qt.ItemDataRole.UserRole) if selected_items else None
+        self.select_tag(tag_id, center=True)
+    
+    def select_tag(self, tag_id, center=False):
+        self.selected_id = tag_id if tag_id in self.store else None
+        if self.selected_id is None:
+            self.end_edit()
             return
-            
-        selected_item = selected_items[0]
-        tag_text = selected_item.text()
-        
-        for tag_id, tag_info in self.tags.items():
-            if tag_info['label'] == tag_text:
-                tag_info['rect'].setSelected(True)
-                self.main_window.graphics_view.centerOn(tag_info['rect'])
-            else:
-                tag_info['rect'].setSelected(False)
+        rect_item = self.begin_edit(tag_id)
+        rect_item.setSelected(True)
+        if center:
+            self.main_window.graphics_view.centerOn(rect_item)
     
     def clear_tag_layer(self):
         if self.tag_layer:
-            for tag_id, tag_info in self.tags.items():
-                self.main_window.scene.removeItem(tag_info['rect'])
-            self.tags.clear()
+            self.cancel_load()
+            self.end_edit()
+            self.detach_batch_item()
+            self.store.clear()
+            self.list_items.clear()
+            self.selected_id = None
             self.tag_list.clear()
             self.tag_layer = None
             self.main_window.statusBar.showMessage("Tag layer cleared", 2000)
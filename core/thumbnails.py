@@ -0,0 +1,45 @@
+import numpy as np
+from core.raster_source import RasterSource, to_uint8
+from core.raster_stats import load_stats, sample_range
+from core.disk_cache import disk_cache, file_key, entry_name
+
+
+THUMBNAIL_SIZE = 128
+
+
+def thumbnail_shape(width, height, size):
+    scale = min(1.0, size / max(width, height))
+    return max(1, round(height * scale)), max(1, round(width * scale))
+
+
+def make_thumbnail(pth, size=THUMBNAIL_SIZE):
+    source = RasterSource(pth)
+    try:
+        # A reduced read: GDAL serves it from embedded overviews when the file has them,
+        # and mapped files only touch the sampled rows.
+        img = source.read(None, out_shape=thumbnail_shape(source.width, source.height, size))
+        # Statistics the viewer already computed give the same contrast as the full image;
+        # otherwise the thumbnail's own pixels are a close enough sample.
+        stats = load_stats(source)
+        lo, hi = stats.display_range() if stats is not None else sample_range(img, source.nodata)
+        return np.ascontiguousarray(to_uint8(img, lo, hi))
+    finally:
+        source.close()
+
+
+def cached_thumbnail(pth, size=THUMBNAIL_SIZE):
+    try:
+        key = file_key(pth)
+    except OSError:
+        return None
+    img = disk_cache.get(key, entry_name("thumb", "default", size))
+    return None if img is None else np.array(img)
+
+
+def load_thumbnail(pth, size=THUMBNAIL_SIZE):
+    # Runs in worker processes; the disk cache is shared with the viewer and other workers.
+    img = cached_thumbnail(pth, size)
+    if img is None:
+        img = make_thumbnail(pth, size)
+        disk_cache.put(file_key(pth), entry_name("thumb", "default", size), img)
+    return img
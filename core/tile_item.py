@@ -0,0 +1,194 @@
+import math
+import logging
+import itertools
+from PyQt6.QtWidgets import QGraphicsItem, QStyleOptionGraphicsItem
+from PyQt6.QtGui import QPixmap
+from PyQt6.QtCore import QObject, QRunnable, QThreadPool, QRectF, pyqtSignal
+from utils.image_buffer import numpy_to_qimage
+from utils.instrumentation import instrumentation
+
+log = logging.getLogger(__name__)
+
+
+def pixmap_nbytes(entry):
+    pixmap = entry[0]
+    return pixmap.width() * pixmap.height() * max(1, pixmap.depth() // 8)
+
+
+class TileSignals(QObject):
+    finished = pyqtSignal(object, object, object)
+
+
+class TileTask(QRunnable):
+    def __init__(self, key, render_tile, tile_size, signals):
+        super().__init__()
+        self.setAutoDelete(False)
+        self.key = key
+        self.render_tile = render_tile
+        self.tile_size = tile_size
+        self.signals = signals
+        self.cancelled = False
+
+    def run(self):
+        if self.cancelled:
+            return
+        _, _, factor, tx, ty = self.key
+        try:
+            with instrumentation.span("render_tile", factor=factor):
+                window, img = self.render_tile(factor, tx, ty, self.tile_size)
+            with instrumentation.span("qimage"):
+                result = (window, numpy_to_qimage(img))
+        except Exception as e:
+            log.warning("Failed to render tile %s: %s", self.key, e)
+            result = None
+        if not self.cancelled:
+            self.signals.finished.emit(self, self.key, result)
+
+
+class TiledRasterItem(QGraphicsItem):
+    request_counter = itertools.count()
+
+    def __init__(self, pyramid, render_tile, cache, cache_key, tile_size=512, pool=None):
+        super().__init__()
+        self.pyramid = pyramid
+        self.render_tile = render_tile
+        self.cache = cache
+        self.cache_key = cache_key
+        self.tile_size = tile_size
+        self.pool = pool if pool is not None else QThreadPool.globalInstance()
+        self.variant = None
+        self.preview = False
+        self.preview_bias = 2
+        self.pending = {}
+        self.drawn = {}
+        self.closed = False
+        self.signals = TileSignals()
+        self.signals.finished.connect(self.on_tile_finished)
+        self.rect = QRectF(0, 0, pyramid.source.width, pyramid.source.height)
+        self.setFlag(QGraphicsItem.GraphicsItemFlag.ItemUsesExtendedStyleOption, True)
+
+    def boundingRect(self):
+        return self.rect
+
+    def visible_tiles(self, factor, rect):
+        width, height = self.pyramid.level_size(factor)
+        sx = self.rect.width() / width * self.tile_size
+        sy = self.rect.height() / height * self.tile_size
+        cols, rows = self.pyramid.tile_grid(factor, self.tile_size)
+        tx0 = max(0, int(rect.left() // sx))
+        ty0 = max(0, int(rect.top() // sy))
+        tx1 = min(cols, math.ceil(rect.right() / sx))
+        ty1 = min(rows, math.ceil(rect.bottom() / sy))
+        return [(tx, ty) for ty in range(ty0, ty1) for tx in range(tx0, tx1)]
+
+    def tile_rect(self, factor, tx, ty):
+        width, height = self.pyramid.level_size(factor)
+        sx = self.rect.width() / width * self.tile_size
+        sy = self.rect.height() / height * self.tile_size
+        return QRectF(tx * sx, ty * sy, sx, sy).intersected(self.rect)
+
+    def request_tile(self, key):
+        if key in self.pending or self.closed:
+            return
+        task = TileTask(key, self.render_tile, self.tile_size, self.signals)
+        self.pending[key] = task
+        self.pool.start(task, next(self.request_counter))
+
+    def on_tile_finished(self, task, key, result):
+        if self.pending.get(key) is task:
+            del self.pending[key]
+        if self.closed or task.cancelled or result is None or key[:2] != (self.cache_key, self.variant):
+            return
+        window, qimage = result
+        target = QRectF(window.col_off, window.row_off, window.width, window.height)
+        with instrumentation.span("pixmap_upload"):
+            pixmap = QPixmap.fromImage(qimage)
+        self.cache.put(key, (pixmap, target))
+        self.update(target)
+
+    def seed_tiles(self, factor, tiles):
+        for (tx, ty), (window, img) in tiles.items():
+            key = (self.cache_key, None, factor, tx, ty)
+            if key not in self.cache:
+                self.cache.put(key, make_tile_entry(window, img))
+
+    def draw_entries(self, painter, entries, rect):
+        painter.save()
+        painter.setClipRect(rect)
+        for pixmap, target in entries:
+            painter.drawPixmap(target, pixmap, QRectF(pixmap.rect()))
+        painter.restore()
+
+    def draw_fallback(self, painter, factor, rect):
+        for coarser in self.pyramid.levels:
+            if coarser <= factor:
+                continue
+            entries = [self.cache.get((self.cache_key, self.variant, coarser, tx, ty))
+                       for tx, ty in self.visible_tiles(coarser, rect)]
+            if all(entry is not None for entry in entries):
+                self.draw_entries(painter, entries, rect)
+                return
+
+        # Keep showing finished tiles of a superseded variant until the new ones arrive.
+        stale = []
+        for key in self.drawn.values():
+            if key[:2] == (self.cache_key, self.variant):
+                continue
+            entry = self.cache.get(key)
+            if entry is not None and entry[1].intersects(rect):
+                stale.append((-key[2], entry))
+        stale.sort(key=lambda item: item[0])
+        self.draw_entries(painter, [entry for _, entry in stale], rect)
+
+    def paint(self, painter, option, widget=None):
+        scale = QStyleOptionGraphicsItem.levelOfDetailFromTransform(painter.worldTransform())
+        if self.preview:
+            scale /= self.preview_bias
+        factor = self.pyramid.level_for_scale(scale)
+        exposed = option.exposedRect.intersected(self.rect)
+        for tx, ty in self.visible_tiles(factor, exposed):
+            key = (self.cache_key, self.variant, factor, tx, ty)
+            entry = self.cache.get(key)
+            if entry is None:
+                self.request_tile(key)
+                self.draw_fallback(painter, factor, self.tile_rect(factor, tx, ty))
+                continue
+            pixmap, target = entry
+            painter.drawPixmap(target, pixmap, QRectF(pixmap.rect()))
+            self.drawn[(factor, tx, ty)] = key
+
+    def invalidate(self, variant=None, cache_key=None):
+        # A new cache key means the same pixels are displayed differently (a new display range);
+        # the old tiles stay up as fallbacks until the new ones arrive, like a superseded variant.
+        if cache_key is not None:
+            self.cache_key = cache_key
+        self.variant = variant
+        for key, task in list(self.pending.items()):
+            if key[:2] != (self.cache_key, variant):
+                task.cancelled = True
+                self.pool.tryTake(task)
+                del self.pending[key]
+        displayed = set(self.drawn.values())
+        self.cache.discard(lambda key: key[0] == self.cache_key and key[1] not in (None, variant)
+                           and key not in displayed)
+        self.drawn = {slot: key for slot, key in self.drawn.items() if key in self.cache}
+        self.update()
+
+    def set_preview(self, preview):
+        if preview != self.preview:
+            self.preview = preview
+            self.update()
+
+    def cancel_pending(self):
+        self.closed = True
+        for task in self.pending.values():
+            task.cancelled = True
+            self.pool.tryTake(task)
+        self.pending.clear()
+
+
+def make_tile_entry(window, img):
+    qimage = numpy_to_qimage(img)
+    with instrumentation.span("pixmap_upload"):
+        pixmap = QPixmap.fromImage(qimage)
+    return pixmap, QRectF(window.col_off, window.row_off, window.width, window.height)
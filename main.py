@@ -1,18 +1,34 @@
 import sys
 import os
+import time
+from functools import partial
 import numpy as np
-import cv2
 from PyQt6.QtWidgets import(
     QApplication, QMainWindow, QFileDialog, QVBoxLayout, QWidget,
     QLabel, QHBoxLayout, QToolBar, QStatusBar,
     QDockWidget, QListWidget, QMessageBox, QGraphicsView,
-    QGraphicsScene, QGraphicsPixmapItem
+    QGraphicsScene
 )
-from PyQt6.QtGui import QAction, QIcon, QPainter, QImage, QPixmap, QFont, QShortcut, QKeySequence
-from PyQt6.QtCore import Qt, QSize, QEvent
+from PyQt6.QtGui import QAction, QIcon, QPainter, QFont, QShortcut, QKeySequence
+from PyQt6.QtCore import Qt, QSize, QEvent, QRectF
 from utils.log_transfer import LogTransfer
 from core.tagging_system import TagHandler
 from utils.image_adjustment import ImageAdjustment
+from utils.band_manager import BandManager
+from core.raster_source import RasterSource, display_key
+from core.disk_cache import disk_cache, entry_name
+from core.pyramid import RasterPyramid
+from core.tile_item import TiledRasterItem, pixmap_nbytes
+from utils.lru_cache import LRUCache
+from core.prefetch import Prefetcher
+from core.image_loader import ImageLoader
+from core.raster_stats import stats_cache
+from utils.instrumentation import instrumentation
+from utils.perf_overlay import PerfOverlay
+from utils.thumbnail_browser import ThumbnailBrowser
+from core.folder_catalog import FolderCatalog, read_header
+from core.catalog_scanner import CatalogScanner
+from core.folder_watcher import FolderWatcher
 
 
 class TifViewer(QMainWindow):
@@ -28,8 +44,38 @@ class TifViewer(QMainWindow):
         self.log_transfer = LogTransfer()
         self.adjust_dock = None
         self.adjustment = ImageAdjustment(self)
+        self.band_manager = BandManager(self)
+        self.source = None
+        self.pyramid = None
+        self.tile_cache = LRUCache(256 * 1024 * 1024, sizeof=pixmap_nbytes)
+        self.display_tile_cache = LRUCache(256 * 1024 * 1024, sizeof=lambda entry: entry[1].nbytes)
+        self.prefetcher = Prefetcher(self)
+        self.prefetch_radius = 2
+        self.loader = ImageLoader(self)
+        self.loader.signals.progress.connect(self.on_load_progress)
+        self.loader.signals.loaded.connect(self.on_image_loaded)
+        self.loader.signals.failed.connect(self.on_load_failed)
+        self.loader.signals.ranged.connect(self.on_display_range)
+        self.load_started = None
+        self.catalog = None
+        self.current_header = None
+        self.scanner = CatalogScanner(self)
+        self.scanner.signals.listed.connect(self.on_catalog_listed)
+        self.scanner.signals.progress.connect(self.on_catalog_progress)
+        self.scanner.signals.finished.connect(self.on_catalog_finished)
+        self.scanner.signals.failed.connect(self.on_catalog_failed)
+        self.watcher = FolderWatcher(self)
+        self.watcher.ready.connect(self.on_files_ready)
+        self.watcher.removed.connect(self.on_files_removed)
+        self.watcher.rescan.connect(self.rescan_folder)
+        self.rescan_wanted = False
+        self.rescan_task = None
+        self.newest_path = None
+        self.perf_overlay = PerfOverlay(self)
+        self.thumbnails = ThumbnailBrowser(self)
         
         self.init_ui()
+        self.watch_caches()
         
     def eventFilter(self, source, event):
         if(source is self.graphics_view.viewport()and event.type()==QEvent.Type.Wheel):
@@ -47,6 +93,7 @@ class TifViewer(QMainWindow):
         self.main_layout.setContentsMargins(2, 2, 2, 2)
         
         self.init_layer_dock()
+        self.addDockWidget(Qt.DockWidgetArea.BottomDockWidgetArea, self.thumbnails.create_dock())
         
         self.right_panel = QWidget()
         self.right_layout = QVBoxLayout(self.right_panel)
@@ -62,7 +109,20 @@ class TifViewer(QMainWindow):
         self.info_label = QLabel("Open a TIF file")
         self.info_label.setAlignment(Qt.AlignmentFlag.AlignLeft)
         self.info_label.setWordWrap(True)
-        self.right_layout.addWidget(self.info_label)
+        info_row = QHBoxLayout()
+        info_row.addWidget(self.info_label, stretch=1)
+        info_row.addWidget(self.perf_overlay.create_overlay_label())
+        self.right_layout.addLayout(info_row)
+    
+    def watch_caches(self):
+        instrumentation.watch_cache("tile_cache", self.tile_cache)
+        instrumentation.watch_cache("display_tiles", self.display_tile_cache)
+        instrumentation.watch_cache("prefetch", self.prefetcher.cache)
+        instrumentation.watch_cache("stats", stats_cache)
+        instrumentation.watch_cache("log_tiles", self.log_transfer.log_layer)
+        instrumentation.watch_cache("tag_sidecars", self.tag_handler.sidecar_cache)
+        instrumentation.watch_cache("disk_cache", disk_cache)
+        instrumentation.watch_cache("thumbnails", self.thumbnails.cache)
             
     def init_graphics_view(self):
         self.graphics_view = QGraphicsView()
@@ -76,8 +136,7 @@ class TifViewer(QMainWindow):
         self.graphics_view.setScene(self.scene) 
         self.right_layout.addWidget(self.graphics_view, stretch=1)
         
-        self.image_item = QGraphicsPixmapItem()
-        self.scene.addItem(self.image_item)
+        self.image_item = None
         
     def init_layer_dock(self):
         dock = QDockWidget("Layer Control", self)
@@ -97,6 +156,8 @@ class TifViewer(QMainWindow):
         dock_layout.addWidget(QLabel("Layers:"))
         dock_layout.addWidget(toolbar)
         dock_layout.addWidget(self.vector_list)
+        dock_layout.addWidget(QLabel("Bands:"))
+        dock_layout.addWidget(self.band_manager.create_band_panel())
         
         dock.setWidget(dock_widget)
         self.addDockWidget(Qt.DockWidgetArea.LeftDockWidgetArea, dock)
@@ -152,8 +213,32 @@ class TifViewer(QMainWindow):
         next_action.triggered.connect(self.next_image)
         toolbar.addAction(next_action)
         
+        self.watch_action = QAction(QIcon.fromTheme("view-refresh"), "Watch Folder", self)
+        self.watch_action.setCheckable(True)
+        self.watch_action.toggled.connect(self.toggle_watch)
+        toolbar.addAction(self.watch_action)
+        
+        self.follow_action = QAction(QIcon.fromTheme("go-last"), "Follow Newest", self)
+        self.follow_action.setCheckable(True)
+        toolbar.addAction(self.follow_action)
+        
+        thumbnails_action = QAction(QIcon.fromTheme("view-grid"), "Thumbnails", self)
+        thumbnails_action.setShortcut("Ctrl+B")
+        thumbnails_action.triggered.connect(self.thumbnails.toggle)
+        toolbar.addAction(thumbnails_action)
+        
         toolbar.addSeparator()
         
+        perf_action = QAction(QIcon.fromTheme("utilities-system-monitor"), "Performance Overlay", self)
+        perf_action.setShortcut("F12")
+        perf_action.setCheckable(True)
+        perf_action.toggled.connect(self.perf_overlay.set_visible)
+        toolbar.addAction(perf_action)
+        
+        trace_action = QAction(QIcon.fromTheme("document-save-as"), "Export Trace", self)
+        trace_action.triggered.connect(self.perf_overlay.export_trace)
+        toolbar.addAction(trace_action)
+        
     def toggle_adjustment(self):
 
         if self.adjust_dock is None:
@@ -174,57 +259,174 @@ class TifViewer(QMainWindow):
             self.vector_list.clear()
             self.active_vector_layers.clear()
             self.statusBar.showMessage(f"Opened folder: {folder_pth}", 3000)
-            self.files = [f for f in os.listdir(self.folder) if f.lower().endswith(('.tif', '.tiff'))]
-            self.current_index = 0
-            if not self.files:
-                QMessageBox.information(self, "Info", "No TIF files found in the folder.")
-                return
+            self.scanner.cancel()
+            if self.catalog is not None:
+                self.catalog.close()
+            # The index from the last visit is shown straight away; the rescan then brings it up to date.
+            self.catalog = FolderCatalog(folder_pth)
+            self.files = []
+            self.current_index = -1
+            self.newest_path = None
+            self.prefetcher.clear()
+            self.rescan_wanted = False
+            if self.watch_action.isChecked():
+                self.watcher.start(folder_pth)
+            self.refresh_files()
+            self.scanner.scan(self.catalog, watch=self.watcher.active)
+            if self.files:
+                self.next_image()
+    
+    def refresh_files(self, scroll=True):
+        if self.catalog is None:
+            return
+        try:
+            current = os.path.relpath(self.current_path, self.folder) if self.current_path else None
+        except ValueError:
+            current = None
+        try:
+            self.files = self.catalog.query(*self.thumbnails.sort_options())
+        except Exception as e:
+            self.statusBar.showMessage(f"Catalog query failed: {e}", 5000)
+            return
+        if self.watcher.pending:
+            # Still being written; they join the list once the watcher sees them complete.
+            writing = self.watcher.pending_files()
+            self.files = [f for f in self.files if f not in writing]
+        self.current_index = self.files.index(current) if current in self.files else -1
+        self.thumbnails.set_files(self.folder, self.files)
+        self.thumbnails.set_current(self.current_index, scroll)
+    
+    def on_catalog_listed(self, task, stats, folders):
+        if not self.scanner.is_current(task):
+            return
+        if folders is not None:
+            # Before the refresh, so files still being written are already known as pending.
+            self.watcher.load_snapshot(folders)
+        self.refresh_files(scroll=task is not self.rescan_task)
+        if self.current_index == -1 and self.files:
             self.next_image()
+    
+    def toggle_watch(self, checked):
+        if checked and self.catalog is not None:
+            self.watcher.start(self.folder)
+            # Restarted rather than queued: indexing picks up where it stopped, and the watcher needs a listing now.
+            self.scanner.scan(self.catalog, watch=True)
+            self.statusBar.showMessage(f"Watching {self.folder} for new images", 3000)
+        else:
+            self.watcher.stop()
+            self.newest_path = None
+    
+    def rescan_folder(self):
+        # The watcher's listing comes from the catalog scanner; one already running finishes first.
+        if self.catalog is None or not self.watcher.active:
+            return
+        if self.scanner.is_busy():
+            self.rescan_wanted = True
+            return
+        self.start_rescan()
+    
+    def start_rescan(self):
+        self.rescan_wanted = False
+        if self.catalog is not None and self.watcher.active:
+            self.scanner.scan(self.catalog, watch=True)
+            self.rescan_task = self.scanner.task
+    
+    def on_files_ready(self, files):
+        if self.catalog is None:
+            return
+        self.catalog.update_files(files)
+        for rel, *_ in files:
+            self.thumbnails.invalidate(os.path.join(self.folder, rel))
+        # Not scrolled: the user may be browsing elsewhere in the list while files arrive.
+        self.refresh_files(scroll=False)
+        newest = max(files, key=lambda entry: entry[1])[0]
+        if newest not in self.files:
+            return
+        self.statusBar.showMessage(f"New image: {newest}", 3000)
+        if self.follow_action.isChecked():
+            self.jump_to_image(self.files.index(newest))
+        else:
+            self.newest_path = os.path.join(self.folder, newest)
+            self.prefetch_neighbours(1)
+    
+    def on_files_removed(self, rels):
+        if self.catalog is None:
+            return
+        self.catalog.remove_files(rels)
+        self.refresh_files(scroll=False)
+    
+    def on_catalog_progress(self, task, done, total):
+        if self.scanner.is_current(task):
+            self.statusBar.showMessage(f"Indexing headers: {done}/{total}", 2000)
+    
+    def on_catalog_finished(self, task, stats):
+        if not self.scanner.is_current(task):
+            return
+        # A rescan the watcher asked for stays quiet; the folder was reported when it was opened.
+        quiet = task is self.rescan_task
+        self.refresh_files(scroll=not quiet)
+        if self.rescan_wanted:
+            self.start_rescan()
+        if quiet:
+            return
+        self.statusBar.showMessage(
+            f"Indexed {stats['files']} files ({stats['added']} new, {stats['changed']} changed, "
+            f"{stats['removed']} removed)", 5000)
+        if not stats['files']:
+            QMessageBox.information(self, "Info", "No TIF files found in the folder.")
+    
+    def on_catalog_failed(self, task, error):
+        if self.scanner.is_current(task):
+            self.statusBar.showMessage(f"Indexing failed: {error}", 5000)
+            if self.rescan_wanted:
+                self.start_rescan()
         
     def next_image(self):
         if not self.folder or not os.path.isdir(self.folder) or not self.files:
             QMessageBox.information(self, "Info", "Please open a folder first.")
             return
         
-        if self.log_transfer.log_item:
-            print("Clearing log layer and vector list")
-            self.log_transfer.clear_log_layer()
-            self.vector_list.clear()
-            self.log_transfer.log_item = None
-            self.adjustment.log_img = None
-        
-        if self.tag_handler.tag_list is not None:
-            self.tag_handler.clear_tags()
-            
-        if self.current_index >= len(self.files):
+        if self.current_index + 1 >= len(self.files):
             QMessageBox.information(self, "Info", "No more images available.")
             return
         
+        self.current_index += 1
         next_file = os.path.join(self.folder, self.files[self.current_index])
         self.load_tif_file(next_file)
-        self.current_index+=1
+        self.prefetch_neighbours(1)
         
     def prev_image(self):
         if not self.folder or not os.path.isdir(self.folder) or not self.files:
             QMessageBox.information(self, "Info", "Please open a folder first.")
             return
         
-        if self.log_transfer.log_item:
-            print("Clearing log layer and vector list")
-            self.log_transfer.clear_log_layer()
-            self.vector_list.clear()
-            self.log_transfer.log_item = None
-            self.adjustment.log_img = None
-        
-        if self.tag_handler.tag_list is not None:
-            self.tag_handler.clear_tags()
-            
-        self.current_index -= 1
         if self.current_index <= 0:
             QMessageBox.information(self, "Info", "No previous image available.")
             return
+        self.current_index -= 1
         prev_file = os.path.join(self.folder, self.files[self.current_index])
         self.load_tif_file(prev_file)
+        self.prefetch_neighbours(-1)
+    
+    def prefetch_neighbours(self, direction):
+        ahead = [self.current_index + direction * k for k in range(1, self.prefetch_radius + 1)]
+        behind = [self.current_index - direction * k for k in range(1, self.prefetch_radius + 1)]
+        paths = [os.path.join(self.folder, self.files[i]) for i in ahead + behind if 0 <= i < len(self.files)]
+        if self.newest_path is not None and self.newest_path != self.current_path and self.newest_path not in paths:
+            # Watching a live folder: keep the latest capture ready for when the user goes to it.
+            paths.append(self.newest_path)
+        viewport = self.graphics_view.viewport()
+        self.prefetcher.update(paths, (viewport.width(), viewport.height()))
+        self.tag_handler.prefetch_sidecars(paths)
+        self.thumbnails.set_current(self.current_index)
+    
+    def jump_to_image(self, index):
+        if not self.files or index == self.current_index or not 0 <= index < len(self.files):
+            return
+        direction = 1 if index > self.current_index else -1
+        self.current_index = index
+        self.load_tif_file(os.path.join(self.folder, self.files[index]))
+        self.prefetch_neighbours(direction)
 
     def open_file(self):
         file_pth, _ = QFileDialog.getOpenFileName(
@@ -237,80 +439,235 @@ class TifViewer(QMainWindow):
             self.current_file = os.path.basename(file_pth)
             self.vector_layers.clear()
             self.vector_list.clear()
-            if TagHandler is not None:
-                self.tag_handler.clear_tags()
             self.active_vector_layers.clear()
             self.load_tif_file(file_pth)
 
+    def clear_image_layers(self):
+        self.loader.cancel()
+        self.tag_handler.cancel_rect()
+        for item in (self.image_item, self.log_transfer.log_item):
+            if item is not None:
+                item.cancel_pending()
+                self.scene.removeItem(item)
+        self.image_item = None
+        
+        self.log_transfer.clear_log_layer()
+        for entry in self.vector_list.findItems('Log Layer', Qt.MatchFlag.MatchExactly):
+            self.vector_list.takeItem(self.vector_list.row(entry))
+        
+        if self.source is not None:
+            self.source.close()
+            self.source = None
+            self.pyramid = None
+    
     def load_tif_file(self, pth):
         try:
-            if self.log_transfer.log_item:
-                self.log_transfer.clear_log_layer()
-                self.vector_list.clear()
-                self.log_transfer.log_item = None
-                self.adjustment.log_img = None
+            self.clear_image_layers()
         
             if self.tag_handler.tag_list is not None:
-                self.tag_handler.clear_tags()
+                self.tag_handler.leave_image()
                 self.scene.clear()
-                self.image_item = QGraphicsPixmapItem()
-                self.scene.addItem(self.image_item)
             
-            img = cv2.imread(pth, cv2.IMREAD_ANYDEPTH | cv2.IMREAD_ANYCOLOR)
+            self.current_path = pth
+            self.current_header = self.catalog_header(pth)
+            self.tag_handler.enter_image(pth)
+            self.load_started = time.perf_counter()
+            prepared = self.prefetcher.get(pth)
+            if prepared is not None:
+                self.show_image(pth, prepared)
+                return
             
-            if img is None:
-                raise ValueError("Failed to load image. Check if the file is corrupted or unsupported.")
+            info = f"<b>Loading:</b> {os.path.basename(pth)}<br>"
+            header = self.current_header
+            if header is not None:
+                info += (
+                    f"<b>Channels:</b> {header['count']}<br>"
+                    f"<b>Size:</b> {header['width']} × {header['height']}<br>"
+                    f"<b>Type:</b> {header['dtype']}<br>"
+                ) + self.header_info(header)
+            self.info_label.setText(info)
+            viewport = self.graphics_view.viewport()
+            self.loader.load(pth, (viewport.width(), viewport.height()))
             
-            height, width = img.shape[:2]
-            num_channels = img.shape[2] if len(img.shape) == 3 else 1
+        except Exception as e:
+            self.show_load_error(str(e))
+    
+    def catalog_header(self, pth):
+        # The catalog has the header without touching the file; unindexed files fall back to a header read.
+        if self.catalog is not None:
+            try:
+                header = self.catalog.header(os.path.relpath(pth, self.catalog.root))
+            except Exception:
+                header = None
+            if header is not None:
+                return header
+        try:
+            return read_header(pth)
+        except Exception:
+            return None
+    
+    def header_info(self, header):
+        layout = f"tiled {header['block_width']} × {header['block_height']}" if header['tiled'] else "striped"
+        if header['compression']:
+            layout += f", {header['compression'].lower()}"
+        if header['overviews']:
+            layout += f", {header['overviews']} overviews"
+        return f"<b>CRS:</b> {header['crs'] or 'none'}<br><b>Layout:</b> {layout}<br>"
+    
+    def change_band_selection(self, selection):
+        if self.source is None or selection == self.source.selection:
+            return
+        pth = self.current_path
+        self.clear_image_layers()
+        self.info_label.setText(f"<b>Loading:</b> {os.path.basename(pth)} ({selection.label})")
+        viewport = self.graphics_view.viewport()
+        self.loader.load(pth, (viewport.width(), viewport.height()), selection)
+    
+    def on_load_progress(self, task, percent, message):
+        if self.loader.is_current(task):
+            self.statusBar.showMessage(f"Loading {os.path.basename(task.path)}: {message} ({percent}%)")
+    
+    def on_image_loaded(self, task, prepared):
+        if task is self.loader.task and not task.cancelled:
+            self.loader.task = None
+            self.show_image(task.path, prepared)
+    
+    def on_load_failed(self, task, error):
+        if task is self.loader.task and not task.cancelled:
+            self.loader.task = None
+            self.show_load_error(error)
+    
+    def show_load_error(self, error):
+        print(error)
+        self.info_label.setText(f"<b>Error:</b> {error}")
+        self.statusBar.showMessage(f"Error: {error}", 5000)
+    
+    def show_image(self, pth, prepared):
+        try:
+            source = RasterSource(pth)
+            source.set_selection(prepared.selection)
+            width, height = source.width, source.height
             
             info = (
                 f"<b>File:</b> {os.path.basename(pth)}<br>"
-                f"<b>Channels:</b> {num_channels}<br>"
+                f"<b>Channels:</b> {source.count}<br>"
+                f"<b>Bands:</b> {source.selection.label}<br>"
                 f"<b>Size:</b> {width} × {height}<br>"
+                f"<b>Type:</b> {source.dtype}<br>"
             )
+            if self.current_header is not None and pth == self.current_path:
+                info += self.header_info(self.current_header)
             
             self.info_label.setText(info)
+            source.display_range = prepared.display_range
+            self.source = source
+            self.band_manager.set_source(source)
+            self.pyramid = RasterPyramid(source)
+            self.pyramid.decimated.update(prepared.levels)
+            margin = max(width, height) / 2
+            self.scene.setSceneRect(self.image_rect().adjusted(-margin, -margin, margin, margin))
             
-            if num_channels >= 3:
-                img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-                if img_rgb.dtype != np.uint8:
-                    img_rgb = cv2.normalize(img_rgb, None, 0, 255, cv2.NORM_MINMAX, dtype=cv2.CV_8U)
-                
-                bytes_per_line = 3 * width
-                qimage = QImage(img_rgb.data, width, height, bytes_per_line, QImage.Format.Format_RGB888)
-            else:
-                if img.dtype != np.uint8:
-                    img = cv2.normalize(img, None, 0, 255, cv2.NORM_MINMAX, dtype=cv2.CV_8U)
-                
-                qimage = QImage(img.data, width, height, width, QImage.Format.Format_Grayscale8)
-            
-            self.adjustment.set_original_image(img)
+            self.adjustment.clear()
+            self.set_layer_ranges(source)
+            tile_size = source.preferred_tile_size()
+            render_tile = partial(self.render_image_tile, self.pyramid)
+            layer_key = (pth, display_key(source.selection.key, source.display_range))
+            self.image_item = TiledRasterItem(self.pyramid, render_tile, self.tile_cache, ("Image",) + layer_key, tile_size)
+            self.scene.addItem(self.image_item)
+            if prepared.tile_size == tile_size:
+                self.image_item.seed_tiles(prepared.factor, prepared.tiles)
+                for (tx, ty), entry in prepared.tiles.items():
+                    self.display_tile_cache.put(layer_key + (prepared.factor, tx, ty, tile_size), entry)
+            self.graphics_view.fitInView(self.image_item, Qt.AspectRatioMode.KeepAspectRatio)
             
-            pixmap = QPixmap.fromImage(qimage)
-            self.image_item.setPixmap(pixmap)
-            reply = QMessageBox.question(self, 'Log', 'Create log layer?', QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
-            if self.log_transfer.log_item is None and reply == QMessageBox.StandardButton.Yes:
-                img_arr = img_rgb if num_channels >= 3 else img
-                self.log_transfer.log_item, log_i = self.log_transfer.create_log_layer(
-                    self.scene, img_arr, width, height)
-                self.adjustment.set_log_image(log_i)
-                self.vector_list.addItem('Log Layer')
+            self.set_log_placeholder(layer_key)
+            self.vector_list.addItem('Log Layer')
             
             self.statusBar.showMessage(f"Loaded: {pth}", 3000)
-            self.graphics_view.fitInView(self.image_item, Qt.AspectRatioMode.KeepAspectRatio)
+            if not prepared.exact:
+                self.loader.load_stats(pth, source.selection)
+            if self.load_started is not None:
+                instrumentation.add_span("image_switch", self.load_started, time.perf_counter(), {"path": pth})
+                self.load_started = None
             
         except Exception as e:
-            print(str(e))
-            self.info_label.setText(f"<b>Error:</b> {str(e)}")
-            self.statusBar.showMessage(f"Error: {str(e)}", 5000)
-            
+            self.show_load_error(str(e))
+
+    def set_layer_ranges(self, source):
+        lo, hi = source.display_range
+        image_range = (lo, hi) if source.dtype == np.uint8 else (0, 255)
+        self.adjustment.set_layer_range("Image", image_range)
+        log_range = self.log_transfer.apply_log_transfer(np.array(image_range), img_max=image_range[1])
+        self.adjustment.set_layer_range("Log Layer", (int(log_range[0]), int(log_range[1])))
+    
+    def set_log_placeholder(self, layer_key):
+        render_tile = partial(self.render_log_tile, self.pyramid)
+        self.log_transfer.set_log_placeholder(
+            partial(TiledRasterItem, self.pyramid, render_tile, self.tile_cache, ("Log Layer",) + layer_key,
+                    self.source.preferred_tile_size()))
+    
+    def on_display_range(self, task, display_range):
+        source = self.source
+        if task is not self.loader.stats_task or task.cancelled or source is None:
+            return
+        pth = task.path
+        self.loader.stats_task = None
+        self.statusBar.clearMessage()
+        if display_range == source.display_range:
+            return
+        # The preview was stretched with a sampled range; redraw with the exact one. Tiles are keyed
+        # by the range, so the sampled ones are never served again, and stay up until replaced.
+        source.display_range = display_range
+        self.set_layer_ranges(source)
+        layer_key = (pth, display_key(source.selection.key, display_range))
+        self.image_item.invalidate(self.image_item.variant, ("Image",) + layer_key)
+        if self.log_transfer.log_item is not None:
+            self.log_transfer.log_item.invalidate(self.log_transfer.log_item.variant, ("Log Layer",) + layer_key)
+        else:
+            self.set_log_placeholder(layer_key)
+    
+    def image_rect(self):
+        if self.source is None:
+            return QRectF()
+        return QRectF(0, 0, self.source.width, self.source.height)
+    
+    def layer_item(self, layer_name):
+        if layer_name == "Image":
+            return self.image_item
+        if layer_name == "Log Layer":
+            return self.log_transfer.log_item
+        return None
+    
+    def render_display_tile(self, pyramid, factor, tx, ty, tile_size, display_range):
+        key = (pyramid.source.path, display_key(pyramid.source.selection.key, display_range), factor, tx, ty, tile_size)
+        entry = self.display_tile_cache.get(key)
+        if entry is None:
+            entry = pyramid.read_display_tile(factor, tx, ty, tile_size, display_range)
+            self.display_tile_cache.put(key, entry)
+        return entry
+    
+    def render_image_tile(self, pyramid, factor, tx, ty, tile_size):
+        # Read once: the exact range can replace the sampled one while tiles are rendering.
+        display_range = pyramid.source.display_range
+        window, img = self.render_display_tile(pyramid, factor, tx, ty, tile_size, display_range)
+        return window, self.adjustment.adjust_tile(img, "Image")
+    
+    def render_log_tile(self, pyramid, factor, tx, ty, tile_size):
+        display_range = pyramid.source.display_range
+        window, img = self.render_display_tile(pyramid, factor, tx, ty, tile_size, display_range)
+        source = pyramid.source
+        img_max = display_range[1] if source.dtype == np.uint8 else 255
+        key = (source.cache_key, entry_name("log", display_key(source.selection.key, display_range), factor, tx, ty, tile_size))
+        img = self.log_transfer.get_log_tile(key, img, img_max=img_max)
+        return window, self.adjustment.adjust_tile(img, "Log Layer")
 
     def handle_layer_selection(self):
         selected = self.vector_list.selectedItems()
         selected_texts = [item.text() for item in selected]
         log_layer_selected = "Log Layer" in selected_texts
         tag_layer_selected = "Tag Layer" in selected_texts
+        if log_layer_selected:
+            self.log_transfer.ensure_log_layer(self.scene)
         if self.log_transfer.log_item:
             self.log_transfer.log_item.setVisible(log_layer_selected)
         
@@ -328,7 +685,7 @@ class TifViewer(QMainWindow):
         self.graphics_view.centerOn(center)
 
     def rest_view(self):
-        if hasattr(self, 'image_item'):
+        if self.image_item is not None:
             self.graphics_view.fitInView(self.image_item, Qt.AspectRatioMode.KeepAspectRatio)
     
     def needs_to_save_tags(self):
@@ -352,6 +709,7 @@ class TifViewer(QMainWindow):
             super().wheelEvent(event)
     
     def closeEvent(self, event):
+        self.tag_handler.store_sidecar()
         if self.needs_to_save_tags():
             reply = QMessageBox.question(self, "Save Tags", 
                                          "You have unsaved tags. Do you want to save them before exiting?",
@@ -360,11 +718,20 @@ class TifViewer(QMainWindow):
                 self.tag_handler.save_tags()
                 event.accept()
             elif reply == QMessageBox.StandardButton.No:
+                self.tag_handler.journal.discard()
                 event.accept()
             else:
                 event.ignore()
         else:
             event.accept()
+        if event.isAccepted():
+            self.tag_handler.journal.flush()
+            self.thumbnails.shutdown()
+            self.watcher.stop()
+            self.scanner.cancel()
+            self.loader.cancel()
+            if self.catalog is not None:
+                self.catalog.close()
     
 if __name__ == "__main__":
     app = QApplication(sys.argv)
@@ -0,0 +1,44 @@
+import pytest
+from PyQt6.QtWidgets import QMainWindow, QStatusBar
+from utils.band_manager import BandManager
+
+
+class FakeSource:
+    def __init__(self, count):
+        from core.band_math import default_selection
+        self.count = count
+        self.selection = default_selection(count)
+
+
+def make_manager(count):
+    window = QMainWindow()
+    window.changed = []
+    # The viewer keeps its status bar in an attribute of the same name.
+    window.statusBar = QStatusBar()
+    window.change_band_selection = window.changed.append
+    manager = BandManager(window)
+    manager.create_band_panel()
+    manager.set_source(FakeSource(count))
+    return window, manager
+
+
+def test_two_bands_are_rejected(qapp):
+    window, manager = make_manager(4)
+    red, green, blue = manager.channel_boxes
+    red.setCurrentIndex(red.findData(4))
+    green.setCurrentIndex(green.findData(3))
+    blue.setCurrentIndex(blue.findData(None))
+    with pytest.raises(ValueError, match="one band or three bands"):
+        manager.current_selection()
+    manager.apply_selection()
+    assert window.changed == []
+    assert "one band or three bands" in window.statusBar.currentMessage()
+
+
+def test_single_band(qapp):
+    window, manager = make_manager(4)
+    red, green, blue = manager.channel_boxes
+    red.setCurrentIndex(red.findData(2))
+    green.setCurrentIndex(green.findData(None))
+    blue.setCurrentIndex(blue.findData(None))
+    assert manager.current_selection().bands == [2]
@@ -0,0 +1,30 @@
+import time
+from PyQt6.QtWidgets import QWidget
+from utils.image_adjustment import ImageAdjustment
+
+
+class CountingAdjustment(ImageAdjustment):
+    def __init__(self, parent):
+        super().__init__(parent)
+        self.adjusted_at = []
+
+    def adjust_image(self):
+        self.adjusted_at.append(time.perf_counter())
+
+
+def test_slider_drag_updates_while_moving(qapp):
+    parent = QWidget()
+    adjustment = CountingAdjustment(parent)
+    adjustment.create_adjustment_panel()
+    interval = adjustment.adjust_timer.interval() / 1000.0
+    start = time.perf_counter()
+    value = 0
+    # Slider events closer together than the timer interval, for well over one interval.
+    while time.perf_counter() - start < interval * 10:
+        value = (value + 1) % 100
+        adjustment.brightness_slider.setValue(value)
+        qapp.processEvents()
+        time.sleep(interval / 4)
+    drag_end = time.perf_counter()
+    assert [t for t in adjustment.adjusted_at if t < drag_end], "no update during the drag"
+    assert len(adjustment.adjusted_at) <= 11
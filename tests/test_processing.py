@@ -0,0 +1,21 @@
+import numpy as np
+import rasterio
+from core.processing import ProcessOptions, process_file
+import core.processing as processing
+
+
+def test_chunk_size_is_in_bytes(tmp_path, monkeypatch):
+    src = str(tmp_path / "rgb16.tif")
+    with rasterio.open(src, "w", driver="GTiff", width=512, height=512, count=3, dtype="uint16") as ds:
+        ds.write(np.arange(512 * 512 * 3, dtype=np.uint16).reshape(3, 512, 512) % 4000)
+    reads = []
+    original = processing.chunk_windows
+
+    def recording(source, chunk_pixels):
+        windows = list(original(source, chunk_pixels))
+        reads.extend(w.width * w.height * len(source.bands) * np.dtype(source.dtype).itemsize for w in windows)
+        return windows
+
+    monkeypatch.setattr(processing, "chunk_windows", recording)
+    process_file(src, str(tmp_path / "out.tif"), ProcessOptions(chunk_bytes=256 * 1024))
+    assert reads and max(reads) <= 256 * 1024
@@ -0,0 +1,11 @@
+import numpy as np
+from core.raster_source import display_lut, to_uint8
+
+
+def test_display_lut_built_once_per_range():
+    display_lut.cache_clear()
+    tile = np.arange(0, 4000, dtype=np.uint16).reshape(40, 100)
+    first = to_uint8(tile, 100.0, 3000.0)
+    for _ in range(5):
+        assert np.array_equal(to_uint8(tile, 100.0, 3000.0), first)
+    assert display_lut.cache_info().misses == 1
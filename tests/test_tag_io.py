@@ -0,0 +1,39 @@
+import os
+import numpy as np
+import core.tag_io as tag_io
+from core.tag_io import TagJournal, sidecar_path, find_sidecar, load_tags_file
+
+
+def columns():
+    return np.array([[1.0, 2.0, 3.0, 4.0]]), ["car"], np.array([0])
+
+
+def test_sidecar_falls_back_to_cache_for_read_only_folders(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    (tmp_path / "images").mkdir()
+    image = str(tmp_path / "images" / "a.tif")
+    assert sidecar_path(image) == image + ".tags.npz"
+
+    monkeypatch.setattr(tag_io.os, "access", lambda pth, mode: False)
+    cached = sidecar_path(image)
+    assert cached.startswith(str(tmp_path / "cache"))
+    assert find_sidecar(image) is None
+
+    journal = TagJournal()
+    journal.open(str(tmp_path / "cache" / "journal" / "a.jsonl"))
+    journal.save_sidecar(cached, columns())
+    journal.flush()
+    assert find_sidecar(image) == cached
+    assert load_tags_file(cached)[1] == ["car"]
+
+
+def test_sidecar_write_failures_are_reported(tmp_path):
+    errors = []
+    journal = TagJournal(on_error=lambda pth, message: errors.append(pth))
+    blocker = tmp_path / "blocker"
+    blocker.write_text("")
+    sidecar = os.path.join(str(blocker), "a.tif.tags.npz")
+    journal.open(str(tmp_path / "a.jsonl"))
+    journal.save_sidecar(sidecar, columns())
+    journal.flush()
+    assert errors == [sidecar]
@@ -0,0 +1,86 @@
+from PyQt6.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QLabel, QComboBox, QLineEdit, QPushButton
+from core.band_math import BandSelection, PRESETS
+
+
+class BandManager:
+    def __init__(self, parent):
+        self.parent = parent
+        self.band_count = 0
+        self.channel_boxes = []
+
+    def create_band_panel(self):
+        self.band_panel = QWidget()
+        layout = QVBoxLayout(self.band_panel)
+        layout.setContentsMargins(0, 0, 0, 0)
+
+        channels = QHBoxLayout()
+        for name in ("R", "G", "B"):
+            box = QComboBox()
+            channels.addWidget(QLabel(name))
+            channels.addWidget(box)
+            self.channel_boxes.append(box)
+
+        self.expression_edit = QLineEdit()
+        self.expression_edit.setPlaceholderText("Band math, e.g. (b4 - b3) / (b4 + b3)")
+        self.expression_edit.returnPressed.connect(self.apply_selection)
+
+        self.preset_box = QComboBox()
+        self.preset_box.addItem("Presets")
+        self.preset_box.addItems(list(PRESETS))
+        self.preset_box.activated.connect(self.use_preset)
+
+        self.apply_button = QPushButton("Apply")
+        self.apply_button.clicked.connect(self.apply_selection)
+
+        expression = QHBoxLayout()
+        expression.addWidget(self.expression_edit)
+        expression.addWidget(self.preset_box)
+
+        layout.addLayout(channels)
+        layout.addLayout(expression)
+        layout.addWidget(self.apply_button)
+        self.band_panel.setEnabled(False)
+
+        return self.band_panel
+
+    def set_source(self, source):
+        self.band_count = source.count
+        selection = source.selection
+        for i, box in enumerate(self.channel_boxes):
+            box.blockSignals(True)
+            box.clear()
+            # Only the green and blue channels may be left empty (single band).
+            if i > 0:
+                box.addItem("-", None)
+            for band in range(1, source.count + 1):
+                box.addItem(f"Band {band}", band)
+            band = selection.bands[i] if i < len(selection.bands) else None
+            box.setCurrentIndex(max(0, box.findData(band)))
+            box.blockSignals(False)
+        expression = selection.expression
+        self.expression_edit.setText(expression.text if expression is not None else "")
+        self.band_panel.setEnabled(source.count > 1)
+
+    def use_preset(self, index):
+        if index > 0:
+            self.expression_edit.setText(PRESETS[self.preset_box.itemText(index)])
+        self.preset_box.setCurrentIndex(0)
+
+    def current_selection(self):
+        expression = self.expression_edit.text().strip()
+        if expression:
+            return BandSelection(expression=expression)
+        bands = [box.currentData() for box in self.channel_boxes]
+        bands = [b for b in bands if b is not None]
+        if len(bands) == 2:
+            raise ValueError("Choose one band or three bands")
+        return BandSelection(bands)
+
+    def apply_selection(self):
+        try:
+            selection = self.current_selection()
+            selection.validate(self.band_count)
+        except ValueError as e:
+            self.parent.statusBar.showMessage(f"Bands: {e}", 5000)
+            return
+        self.parent.change_band_selection(selection)
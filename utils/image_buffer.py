@@ -0,0 +1,42 @@
+import numpy as np
+from PyQt6.QtGui import QImage
+
+
+CHANNEL_FORMATS = {
+    1: QImage.Format.Format_Grayscale8,
+    3: QImage.Format.Format_RGB888,
+    4: QImage.Format.Format_RGBA8888,
+}
+
+FORMAT_CHANNELS = {fmt: channels for channels, fmt in CHANNEL_FORMATS.items()}
+
+
+def numpy_to_qimage(img):
+    if img.dtype != np.uint8:
+        raise ValueError(f"Unsupported array type: {img.dtype}")
+    channels = img.shape[2] if img.ndim == 3 else 1
+    if channels not in CHANNEL_FORMATS:
+        raise ValueError(f"Unsupported channel count: {channels}")
+    if not img.flags['C_CONTIGUOUS']:
+        img = np.ascontiguousarray(img)
+    height, width = img.shape[:2]
+    qimage = QImage(img.data, width, height, img.strides[0], CHANNEL_FORMATS[channels])
+    # QImage does not own the buffer; keep the array alive for as long as the image is.
+    qimage._array = img
+    return qimage
+
+
+def qimage_to_numpy(qimage, writable=False):
+    # Returns a view into the image's pixels; it is only valid while qimage is alive.
+    channels = FORMAT_CHANNELS.get(qimage.format())
+    if channels is None:
+        converted = qimage.convertToFormat(QImage.Format.Format_RGBA8888)
+        return qimage_to_numpy(converted).copy()
+    height, width = qimage.height(), qimage.width()
+    ptr = qimage.bits() if writable else qimage.constBits()
+    ptr.setsize(qimage.sizeInBytes())
+    arr = np.frombuffer(ptr, dtype=np.uint8).reshape((height, qimage.bytesPerLine()))
+    arr = arr[:, :width * channels]
+    if channels == 1:
+        return arr
+    return arr.reshape((height, width, channels))
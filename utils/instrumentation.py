@@ -0,0 +1,151 @@
+import os
+import json
+import time
+import threading
+from collections import deque
+
+
+def rss_mb():
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    # Peak rather than current RSS, which is all getrusage offers.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 / 1024 if os.uname().sysname == "Darwin" else peak / 1024
+
+
+class NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL_SPAN = NullSpan()
+
+
+class Span:
+    __slots__ = ("owner", "name", "args", "start")
+
+    def __init__(self, owner, name, args):
+        self.owner = owner
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.owner.add_span(self.name, self.start, time.perf_counter(), self.args)
+        return False
+
+
+class Instrumentation:
+    # Spans, counters and gauges for the hot paths; everything is a no-op until enabled.
+    def __init__(self, max_events=200000):
+        self.enabled = bool(os.environ.get("TIF_VIEWER_TRACE"))
+        self.events = deque(maxlen=max_events)  # (phase, name, start, duration or value, thread, args)
+        self.spans = {}  # {name: [count, total, last, longest]}
+        self.counters = {}
+        self.sources = {}  # {gauge name: callable}, sampled instead of updated on every call
+        self.lock = threading.Lock()
+        self.origin = time.perf_counter()
+
+    def span(self, name, **args):
+        if not self.enabled:
+            return NULL_SPAN
+        return Span(self, name, args)
+
+    def add_span(self, name, start, end, args=None):
+        if not self.enabled:
+            return
+        duration = end - start
+        with self.lock:
+            stats = self.spans.get(name)
+            if stats is None:
+                stats = self.spans[name] = [0, 0.0, 0.0, 0.0]
+            stats[0] += 1
+            stats[1] += duration
+            stats[2] = duration
+            stats[3] = max(stats[3], duration)
+            self.events.append(("X", name, start, duration, threading.get_ident(), args))
+
+    def count(self, name, n=1):
+        if not self.enabled:
+            return
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def gauge(self, name, value):
+        if not self.enabled:
+            return
+        with self.lock:
+            self.events.append(("C", name, time.perf_counter(), value, 0, None))
+
+    def watch(self, name, fn):
+        self.sources[name] = fn
+
+    def watch_cache(self, name, cache):
+        self.watch(f"{name}.mb", lambda: cache.total_bytes / 1024 / 1024)
+        self.watch(f"{name}.hits", lambda: cache.hits)
+        self.watch(f"{name}.misses", lambda: cache.misses)
+
+    def sample(self):
+        values = {}
+        for name, fn in list(self.sources.items()):
+            try:
+                values[name] = fn()
+            except Exception:
+                continue
+        values["memory.rss_mb"] = rss_mb()
+        now = time.perf_counter()
+        with self.lock:
+            values.update(self.counters)
+            if self.enabled:
+                for name, value in values.items():
+                    if value is not None:
+                        self.events.append(("C", name, now, value, 0, None))
+        return values
+
+    def snapshot(self):
+        with self.lock:
+            return {name: list(stats) for name, stats in self.spans.items()}, dict(self.counters)
+
+    def reset(self):
+        with self.lock:
+            self.events.clear()
+            self.spans.clear()
+            self.counters.clear()
+
+    def export_chrome_trace(self, pth):
+        # Chrome trace event format; opens in chrome://tracing, Perfetto and speedscope.
+        self.sample()
+        with self.lock:
+            events = list(self.events)
+        pid = os.getpid()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        trace = [{"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": names.get(tid, f"worker {tid}")}}
+                 for tid in {event[4] for event in events if event[0] == "X"}]
+        for phase, name, start, value, tid, args in events:
+            ts = (start - self.origin) * 1e6
+            if phase == "X":
+                trace.append({"name": name, "cat": name.split(".")[0], "ph": "X", "ts": ts,
+                              "dur": value * 1e6, "pid": pid, "tid": tid, "args": args or {}})
+            else:
+                trace.append({"name": name, "ph": "C", "ts": ts, "pid": pid, "args": {"value": value}})
+        tmp = pth + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"traceEvents": trace, "displayTimeUnit": "ms"}, f)
+        os.replace(tmp, pth)
+        return len(trace)
+
+
+instrumentation = Instrumentation()
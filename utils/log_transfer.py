@@ -1,58 +1,45 @@
-import numpy as np
-from PyQt6.QtGui import QImage, QPixmap
+from utils.lru_cache import LRUCache
+from core.disk_cache import disk_cache
+from core.processing import log_transfer
+from utils.instrumentation import instrumentation
+
 
 class LogTransfer:
     def __init__(self):
         self.log_item = None
+        self.log_factory = None
         self.log_visible = False
-        self.log_layer = None
-        
-    def apply_log_transfer(self, img_arr):
-        img_arr = img_arr.astype(np.float32)
-        
-        img_max = np.max(img_arr)
-        if img_max <= 1e-10:
-            return np.zeros_like(img_arr, dtype=np.uint8)
+        self.log_layer = LRUCache(128 * 1024 * 1024)
         
-        if img_max > 1e10:
-            img_arr = img_arr / img_max * 1000
-            img_max = 1000
-        c = 255.0 / np.log(1 + img_max + 1e-10)
-        log_img = np.zeros_like(img_arr)
-        valid_mask = img_arr > 0
-        log_img[valid_mask] = c * np.log(1 + img_arr[valid_mask])
-        log_img = np.nan_to_num(log_img, nan=0.0, posinf=255.0, neginf=0.0)
-
-        return np.clip(log_img, 0, 255).astype(np.uint8)
+    def apply_log_transfer(self, img_arr, img_max=None, chunk_rows=None):
+        return log_transfer(img_arr, img_max, chunk_rows)
     
-    def create_log_layer(self, scene, img_arr, width, height):
-        log_img_arr = self.apply_log_transfer(img_arr)
-        
-        if len(img_arr.shape) == 3:
-            qimage = QImage(
-                log_img_arr.data,
-                width,
-                height,
-                3 * width, 
-                QImage.Format.Format_RGB888
-            )
-        else:
-            qimage = QImage(
-                log_img_arr.data,
-                width,
-                height,
-                width,  
-                QImage.Format.Format_Grayscale8
-            )
-        
-        pixmap = QPixmap.fromImage(qimage)
-        log_item = scene.addPixmap(pixmap)
+    def get_log_tile(self, key, img_arr, img_max=None):
+        log_img = self.log_layer.get(key)
+        if log_img is None:
+            log_img = disk_cache.get(*key)
+            if log_img is None:
+                with instrumentation.span("log_transfer"):
+                    log_img = self.apply_log_transfer(img_arr, img_max=img_max)
+                disk_cache.put(*key, log_img)
+            self.log_layer.put(key, log_img)
+        return log_img
+
+    def create_log_layer(self, scene, log_item):
         log_item.setVisible(self.log_visible)
+        scene.addItem(log_item)
 
         self.log_item = log_item
-        self.log_layer = log_img_arr
-        
-        return log_item, qimage
+        return log_item
+
+    def set_log_placeholder(self, log_factory):
+        # The layer is only built the first time it is shown.
+        self.log_factory = log_factory
+
+    def ensure_log_layer(self, scene):
+        if self.log_item is None and self.log_factory is not None:
+            self.create_log_layer(scene, self.log_factory())
+        return self.log_item
     
     def toggle_visibility(self):
         if self.log_item:
@@ -61,9 +48,9 @@ class LogTransfer:
         return self.log_visible
     
     def clear_log_layer(self):
+        self.log_factory = None
         if self.log_item:
             self.log_item.setVisible(False)
             self.log_item = None
-            self.log_layer = None
             self.log_visible = False
         return self.log_visible
\ No newline at end of file
@@ -0,0 +1,58 @@
+import threading
+from collections import OrderedDict
+
+
+class LRUCache:
+    def __init__(self, max_bytes, sizeof=None):
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof if sizeof is not None else (lambda value: value.nbytes)
+        self.items = OrderedDict()
+        self.sizes = {}
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.RLock()
+
+    def __contains__(self, key):
+        return key in self.items
+
+    def __len__(self):
+        return len(self.items)
+
+    def get(self, key, default=None):
+        with self.lock:
+            if key in self.items:
+                self.items.move_to_end(key)
+                self.hits += 1
+                return self.items[key]
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        size = self.sizeof(value)
+        with self.lock:
+            self.pop(key)
+            self.items[key] = value
+            self.sizes[key] = size
+            self.total_bytes += size
+            while self.total_bytes > self.max_bytes and len(self.items) > 1:
+                old_key = next(iter(self.items))
+                self.pop(old_key)
+
+    def pop(self, key, default=None):
+        with self.lock:
+            if key not in self.items:
+                return default
+            self.total_bytes -= self.sizes.pop(key)
+            return self.items.pop(key)
+
+    def discard(self, predicate):
+        with self.lock:
+            for key in [k for k in self.items if predicate(k)]:
+                self.pop(key)
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+            self.sizes.clear()
+            self.total_bytes = 0
@@ -0,0 +1,75 @@
+from PyQt6.QtWidgets import QLabel, QFileDialog
+from PyQt6.QtGui import QFont
+from PyQt6.QtCore import Qt, QTimer
+from utils.instrumentation import instrumentation
+
+
+OVERLAY_SPANS = (
+    "image_switch", "prepare_image", "stats", "decode", "normalize", "render_tile", "qimage",
+    "pixmap_upload", "log_transfer", "adjust", "tags.load", "tags.fill", "tags.save", "tags.sidecar",
+)
+
+
+class PerfOverlay:
+    def __init__(self, parent):
+        self.parent = parent
+        self.label = None
+        self.started_enabled = instrumentation.enabled
+        self.timer = QTimer(parent)
+        self.timer.setInterval(500)
+        self.timer.timeout.connect(self.refresh)
+
+    def create_overlay_label(self):
+        self.label = QLabel()
+        self.label.setFont(QFont("Monospace", 8))
+        self.label.setTextFormat(Qt.TextFormat.PlainText)
+        self.label.setAlignment(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignTop)
+        self.label.setVisible(False)
+        return self.label
+
+    def set_visible(self, visible):
+        # Started with TIF_VIEWER_TRACE set, recording stays on when the overlay is hidden.
+        instrumentation.enabled = visible or self.started_enabled
+        self.label.setVisible(visible)
+        if visible:
+            self.refresh()
+            self.timer.start()
+        else:
+            self.timer.stop()
+
+    def refresh(self):
+        gauges = instrumentation.sample()
+        spans, _ = instrumentation.snapshot()
+        lines = [f"{'':14} {'last':>9} {'mean':>9} {'max':>9} {'n':>6}"]
+        for name in OVERLAY_SPANS:
+            stats = spans.get(name)
+            if stats is None:
+                continue
+            count, total, last, longest = stats
+            lines.append(f"{name:14} {last * 1000:7.1f}ms {total / count * 1000:7.1f}ms {longest * 1000:7.1f}ms {count:6d}")
+        for name in sorted(gauges):
+            if not name.endswith(".hits"):
+                continue
+            cache = name[:-len(".hits")]
+            hits, misses = gauges[name], gauges.get(f"{cache}.misses", 0)
+            size = gauges.get(f"{cache}.mb")
+            ratio = hits / (hits + misses) * 100 if hits + misses else 0
+            size_text = f" {size:7.1f}MB" if size is not None else ""
+            lines.append(f"{cache:14} {ratio:5.1f}% hit of {hits + misses:6d}{size_text}")
+        if gauges.get("memory.rss_mb") is not None:
+            lines.append(f"{'rss':14} {gauges['memory.rss_mb']:7.1f}MB")
+        self.label.setText("\n".join(lines))
+
+    def export_trace(self):
+        if not instrumentation.events:
+            self.parent.statusBar.showMessage("No trace recorded yet; turn on the performance overlay first", 5000)
+            return
+        pth, _ = QFileDialog.getSaveFileName(self.parent, "Export Trace", "tif_viewer_trace.json",
+                                             "Trace Files (*.json);;All Files (*)")
+        if pth:
+            try:
+                count = instrumentation.export_chrome_trace(pth)
+            except OSError as e:
+                self.parent.statusBar.showMessage(f"Failed to export trace: {e}", 5000)
+                return
+            self.parent.statusBar.showMessage(f"Exported {count} trace events to {pth}", 5000)
@@ -0,0 +1,304 @@
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from PyQt6.QtWidgets import (QDockWidget, QListView, QAbstractItemView, QWidget, QVBoxLayout, QHBoxLayout,
+                             QLineEdit, QComboBox, QCheckBox, QStyledItemDelegate, QStyleOptionViewItem)
+from PyQt6.QtGui import QPixmap, QColor
+from PyQt6.QtCore import Qt, QAbstractListModel, QModelIndex, QObject, QSize, QTimer, pyqtSignal
+from core.thumbnails import THUMBNAIL_SIZE, cached_thumbnail, load_thumbnail
+from core.folder_catalog import SORT_KEYS
+from utils.image_buffer import numpy_to_qimage
+from utils.lru_cache import LRUCache
+from utils.instrumentation import instrumentation
+
+
+class ThumbnailSignals(QObject):
+    finished = pyqtSignal(str, object, str)
+
+
+def row_runs(rows):
+    # Sorted rows -> [(first, last)] for each run of consecutive rows.
+    runs = []
+    for row in rows:
+        if runs and runs[-1][1] == row - 1:
+            runs[-1] = (runs[-1][0], row)
+        else:
+            runs.append((row, row))
+    return runs
+
+
+class ThumbnailModel(QAbstractListModel):
+    def __init__(self, browser):
+        super().__init__()
+        self.browser = browser
+        self.paths = []
+        self.rows = {}
+
+    def set_paths(self, paths):
+        self.beginResetModel()
+        self.paths = list(paths)
+        self.rows = {pth: row for row, pth in enumerate(self.paths)}
+        self.endResetModel()
+
+    def update_paths(self, paths, limit=1000):
+        # Files that came or went while the rest kept their order (the folder watcher) are inserted and
+        # removed row by row, so the view keeps its scroll position, selection and pending thumbnails.
+        new_rows = set(paths)
+        removed = [row for row, pth in enumerate(self.paths) if pth not in new_rows]
+        added = [row for row, pth in enumerate(paths) if pth not in self.rows]
+        if len(removed) + len(added) > limit:
+            return False
+        if [pth for pth in self.paths if pth in new_rows] != [pth for pth in paths if pth in self.rows]:
+            return False
+        for first, last in reversed(row_runs(removed)):
+            self.beginRemoveRows(QModelIndex(), first, last)
+            del self.paths[first:last + 1]
+            self.endRemoveRows()
+        for first, last in row_runs(added):
+            self.beginInsertRows(QModelIndex(), first, last)
+            self.paths[first:first] = paths[first:last + 1]
+            self.endInsertRows()
+        self.rows = {pth: row for row, pth in enumerate(self.paths)}
+        return True
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.paths)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        pth = self.paths[index.row()]
+        if role == Qt.ItemDataRole.DisplayRole:
+            return os.path.basename(pth)
+        if role == Qt.ItemDataRole.ToolTipRole:
+            return pth
+        if role == Qt.ItemDataRole.DecorationRole:
+            # Only asked for rows the view is about to paint, which is what keeps big folders cheap.
+            return self.browser.thumbnail(index.row(), pth)
+        return None
+
+    def thumbnail_changed(self, pth):
+        row = self.rows.get(pth)
+        if row is not None:
+            index = self.index(row)
+            self.dataChanged.emit(index, index, [Qt.ItemDataRole.DecorationRole])
+
+
+class ThumbnailDelegate(QStyledItemDelegate):
+    def initStyleOption(self, option, index):
+        super().initStyleOption(option, index)
+        option.decorationPosition = QStyleOptionViewItem.Position.Top
+        option.displayAlignment = Qt.AlignmentFlag.AlignHCenter | Qt.AlignmentFlag.AlignTop
+
+
+class ThumbnailBrowser:
+    def __init__(self, parent, size=THUMBNAIL_SIZE):
+        self.parent = parent
+        self.size = size
+        self.dock = None
+        self.view = None
+        self.model = ThumbnailModel(self)
+        self.cache = LRUCache(64 * 1024 * 1024, sizeof=lambda pixmap: pixmap.width() * pixmap.height() * 4)
+        self.failed = set()
+        self.wanted = {}  # {row: path}, newest requests last
+        self.pending = {}  # {path: future}
+        self.workers = max(1, min(4, (os.cpu_count() or 2) - 1))
+        self.executor = None
+        self.signals = ThumbnailSignals()
+        self.signals.finished.connect(self.on_thumbnail)
+        self.dispatch_timer = QTimer(parent)
+        self.dispatch_timer.setSingleShot(True)
+        self.dispatch_timer.setInterval(0)
+        self.dispatch_timer.timeout.connect(self.dispatch)
+        self.filter_timer = QTimer(parent)
+        self.filter_timer.setSingleShot(True)
+        self.filter_timer.setInterval(200)
+        self.filter_timer.timeout.connect(lambda: self.parent.refresh_files())
+        self.placeholder = QPixmap(size, size)
+        self.placeholder.fill(QColor(60, 60, 60))
+        self.broken = QPixmap(size, size)
+        self.broken.fill(QColor(120, 40, 40))
+
+    def create_dock(self):
+        self.dock = QDockWidget("Thumbnails", self.parent)
+        self.dock.setAllowedAreas(Qt.DockWidgetArea.BottomDockWidgetArea | Qt.DockWidgetArea.LeftDockWidgetArea
+                                  | Qt.DockWidgetArea.RightDockWidgetArea)
+        self.view = QListView()
+        # A wrapping list rather than IconMode: icon mode keeps a geometry per item, which makes
+        # laying out tens of thousands of files slow, while a uniform list lays out whole rows at once.
+        self.view.setFlow(QListView.Flow.LeftToRight)
+        self.view.setWrapping(True)
+        self.view.setResizeMode(QListView.ResizeMode.Adjust)
+        self.view.setItemDelegate(ThumbnailDelegate(self.view))
+        self.view.setUniformItemSizes(True)
+        self.view.setIconSize(QSize(self.size, self.size))
+        self.view.setGridSize(QSize(self.size + 16, self.size + 28))
+        self.view.setTextElideMode(Qt.TextElideMode.ElideMiddle)
+        self.view.setSelectionMode(QAbstractItemView.SelectionMode.SingleSelection)
+        self.view.setModel(self.model)
+        self.view.clicked.connect(self.on_clicked)
+        self.view.activated.connect(self.on_clicked)
+        self.view.verticalScrollBar().valueChanged.connect(lambda: self.dispatch_timer.start())
+
+        self.filter_edit = QLineEdit()
+        self.filter_edit.setPlaceholderText("Filter: name, dtype:uint16, bands:3, crs:4326")
+        self.filter_edit.setClearButtonEnabled(True)
+        self.filter_edit.textChanged.connect(lambda: self.filter_timer.start())
+        self.sort_combo = QComboBox()
+        self.sort_combo.addItems(list(SORT_KEYS))
+        self.sort_combo.currentTextChanged.connect(lambda: self.parent.refresh_files())
+        self.descending_check = QCheckBox("Descending")
+        self.descending_check.toggled.connect(lambda: self.parent.refresh_files())
+        controls = QHBoxLayout()
+        controls.setContentsMargins(0, 0, 0, 0)
+        controls.addWidget(self.filter_edit, stretch=1)
+        controls.addWidget(self.sort_combo)
+        controls.addWidget(self.descending_check)
+
+        widget = QWidget()
+        layout = QVBoxLayout(widget)
+        layout.setContentsMargins(2, 2, 2, 2)
+        layout.addLayout(controls)
+        layout.addWidget(self.view, stretch=1)
+        self.dock.setWidget(widget)
+        self.dock.setVisible(False)
+        return self.dock
+
+    def sort_options(self):
+        if self.view is None:
+            return "Name", False, ""
+        return self.sort_combo.currentText(), self.descending_check.isChecked(), self.filter_edit.text()
+
+    def toggle(self):
+        self.dock.setVisible(not self.dock.isVisible())
+
+    def set_files(self, folder, files):
+        prefix = os.path.join(folder, "")
+        paths = [prefix + f for f in files]
+        if paths == self.model.paths:
+            return
+        # Rows may have moved; the view asks again for whatever it paints next.
+        self.wanted.clear()
+        if not self.model.update_paths(paths):
+            self.cancel_pending()
+            self.failed.clear()
+            self.model.set_paths(paths)
+        if files:
+            self.dock.setVisible(True)
+
+    def invalidate(self, pth):
+        # The file was rewritten; its disk cache entry is keyed by mtime, so only memory is stale.
+        self.failed.discard(pth)
+        if self.cache.pop(pth) is not None:
+            self.model.thumbnail_changed(pth)
+
+    def set_current(self, row, scroll=True):
+        if self.view is None or not 0 <= row < self.model.rowCount():
+            return
+        index = self.model.index(row)
+        if self.view.currentIndex() == index:
+            return
+        if scroll:
+            self.view.setCurrentIndex(index)
+            self.view.scrollTo(index)
+        else:
+            # The view scrolls to a new current index by itself unless told not to.
+            self.view.setAutoScroll(False)
+            self.view.setCurrentIndex(index)
+            self.view.setAutoScroll(True)
+
+    def on_clicked(self, index):
+        if index.isValid():
+            self.parent.jump_to_image(index.row())
+
+    def thumbnail(self, row, pth):
+        pixmap = self.cache.get(pth)
+        if pixmap is not None:
+            return pixmap
+        if pth in self.failed:
+            return self.broken
+        if pth not in self.pending:
+            self.wanted.pop(row, None)
+            self.wanted[row] = pth
+            self.dispatch_timer.start()
+        return self.placeholder
+
+    def is_visible(self, row):
+        rect = self.view.visualRect(self.model.index(row))
+        return rect.isValid() and rect.intersects(self.view.viewport().rect())
+
+    def dispatch(self):
+        if self.view is None:
+            return
+        # Thumbnails scrolled past before a worker picked them up are dropped, so a fast
+        # scroll through a huge folder does not leave a long queue behind it.
+        for pth, future in list(self.pending.items()):
+            row = self.model.rows.get(pth)
+            if (row is None or not self.is_visible(row)) and future.cancel():
+                del self.pending[pth]
+        # Taken first: asking for a visual rect can lay the view out, which asks for more thumbnails.
+        requested, self.wanted = self.wanted, {}
+        wanted = [(row, pth) for row, pth in reversed(requested.items()) if self.is_visible(row)]
+        for row, pth in wanted:
+            if pth in self.pending or pth in self.cache:
+                continue
+            img = cached_thumbnail(pth, self.size)
+            if img is not None:
+                instrumentation.count("thumbnails.disk")
+                self.on_thumbnail(pth, img, "")
+                continue
+            if len(self.pending) >= self.workers * 2:
+                self.wanted[row] = pth
+                continue
+            try:
+                future = self.get_executor().submit(load_thumbnail, pth, self.size)
+            except BrokenProcessPool as e:
+                # A worker died (out of memory, a crashing driver); start a fresh pool next time.
+                print(f"Thumbnail workers stopped: {e}")
+                self.executor = None
+                self.wanted[row] = pth
+                break
+            self.pending[pth] = future
+            future.add_done_callback(lambda done, pth=pth: self.on_future_done(pth, done))
+
+    def get_executor(self):
+        if self.executor is None:
+            # Spawned rather than forked: the viewer process has Qt and GDAL state a fork would copy.
+            self.executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+        return self.executor
+
+    def on_future_done(self, pth, future):
+        # Called on an executor thread; the signal hands the result to the GUI thread.
+        if future.cancelled():
+            return
+        error = future.exception()
+        if error is not None:
+            self.signals.finished.emit(pth, None, str(error))
+        else:
+            self.signals.finished.emit(pth, future.result(), "")
+
+    def on_thumbnail(self, pth, img, error):
+        self.pending.pop(pth, None)
+        if pth not in self.model.rows:
+            return
+        if img is None:
+            print(f"Failed to create thumbnail for {pth}: {error}")
+            self.failed.add(pth)
+        else:
+            with instrumentation.span("thumbnail_upload"):
+                self.cache.put(pth, QPixmap.fromImage(numpy_to_qimage(img)))
+        self.model.thumbnail_changed(pth)
+        if self.wanted:
+            self.dispatch_timer.start()
+
+    def cancel_pending(self):
+        for future in self.pending.values():
+            future.cancel()
+        self.pending.clear()
+
+    def shutdown(self):
+        self.cancel_pending()
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None